@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import (UserProfile, ContactProfile, Testimonial, Media, Portfolio, Blog, Certificate, Skill)
+from .models import (UserProfile, ProfileSite, ContactProfile, ContactProfileArchive, Testimonial, Media, Portfolio,
+                     Blog, Certificate, Skill)
 
 
 # The register decorator
@@ -8,18 +9,46 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('id', 'user')
 
 
+# host names / path prefixes the profiles are served on (see tenancy.py)
+@admin.register(ProfileSite)
+class ProfileSiteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'host', 'prefix', 'profile')
+    list_select_related = ('profile__user',)
+    search_fields = ('host', 'prefix')
+
+
+# For the models shown on one profile's pages (owner): when no owner is chosen the object belongs to
+# the profile of the admin user saving it.
+class OwnedAdmin(admin.ModelAdmin):
+    list_select_related = ('owner__user',)
+    list_filter = ('owner',)
+
+    def save_model(self, request, obj, form, change):
+        if obj.owner_id is None:
+            obj.owner = UserProfile.objects.filter(user=request.user).first()
+        super().save_model(request, obj, form, change)
+
+
 @admin.register(ContactProfile)
 class ContactAdmin(admin.ModelAdmin):
     # Set list_display to control which fields are displayed on the change list page of the admin.
     # If you don’t set list_display, the admin site will display a single column that displays the __str__()
     # representation of each object.
     # list_display will allow us to display fields that we want in the admin page
-    list_display = ('id', 'timestamp', 'name',)
+    list_display = ('id', 'timestamp', 'name', 'owner')
+    list_filter = ('owner',)
+
+
+# contacts moved out of ContactProfile by the archive_contacts command
+@admin.register(ContactProfileArchive)
+class ContactArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'timestamp', 'name', 'owner', 'archived_at')
+    list_filter = ('owner',)
 
 
 @admin.register(Testimonial)
-class TestimonialAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'is_active')
+class TestimonialAdmin(OwnedAdmin):
+    list_display = ('id', 'name', 'owner', 'is_active')
 
 
 @admin.register(Media)
@@ -28,22 +57,22 @@ class MediaAdmin(admin.ModelAdmin):
 
 
 @admin.register(Portfolio)
-class PortfolioAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'is_active')
+class PortfolioAdmin(OwnedAdmin):
+    list_display = ('id', 'name', 'owner', 'is_active')
     # read only field should be slug, which could be a blog link,
     # so that it remains the same each time the blog link is created
     readonly_fields = ('slug',)
 
 
 @admin.register(Blog)
-class BlogAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'is_active')
+class BlogAdmin(OwnedAdmin):
+    list_display = ('id', 'name', 'owner', 'is_active')
     readonly_fields = ('slug',)
 
 
 @admin.register(Certificate)
-class CertificateAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name')
+class CertificateAdmin(OwnedAdmin):
+    list_display = ('id', 'name', 'owner')
 
 
 @admin.register(Skill)
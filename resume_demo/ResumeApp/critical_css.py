@@ -0,0 +1,233 @@
+# Critical CSS: per page, only the css rules of bootstrap.min.css and style.css the page's templates can use,
+# so they can be inlined in <head> while the full stylesheets load without blocking the first paint.
+#
+# python manage.py build_critical_css reads the templates of every page (the page template, base.html and the
+# partials), collects the tag names, classes and ids they use (plus the classes script.js adds) and keeps the css rules
+# whose selectors only need those. The result is written to static/css/critical/<url name>.css and inlined by the
+# {% critical_css %} tag in base.html. Rerun the command after changing the templates or the stylesheets.
+import functools
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template
+
+# url name -> page template, see urls.py / views.py
+PAGES = {
+    "home": "ResumeApp/index.html",
+    "blogs": "ResumeApp/blog.html",
+    "blog": "ResumeApp/blog-detail.html",
+    "portfolios": "ResumeApp/portfolio.html",
+    "portfolio": "ResumeApp/portfolio-detail.html",
+    "contact": "ResumeApp/contact.html",
+}
+# stylesheets of base.html, in order
+STYLESHEETS = ["css/bootstrap.min.css", "css/style.css"]
+SCRIPTS = ["js/script.js"]
+CRITICAL_DIRECTORY = "css/critical"
+# html that is not in the templates themselves: ckeditor bodies ({{object.body|safe}}) and form widgets ({{form.x}})
+CONTENT_TAGS = {"p", "a", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "img", "strong", "b", "em", "i",
+                "blockquote", "pre", "code", "table", "thead", "tbody", "tr", "th", "td", "hr", "br", "figure"}
+FORM_TAGS = {"input", "textarea", "select", "label", "button"}
+
+TEMPLATE_TAG_RE = re.compile(r"{%.*?%}|{{.*?}}|{#.*?#}", re.S)
+EXTENDS_RE = re.compile(r"{%\s*extends\s+['\"]([^'\"]+)['\"]\s*%}")
+INCLUDE_RE = re.compile(r"{%\s*include\s+['\"]([^'\"]+)['\"]")
+BLOCK_RE = re.compile(r"{%\s*block\s+\w+\s*%}(.*?){%\s*endblock", re.S)
+HTML_TAG_RE = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)")
+CLASS_ATTR_RE = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+ID_ATTR_RE = re.compile(r"""\bid\s*=\s*(?:"([^"]*)"|'([^']*)')""")
+JS_CLASS_RE = re.compile(r"""(?:add|remove|toggle)Class\(\s*['"]([^'"]+)['"]""")
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+
+
+class UsedNames:
+    # tag names, classes and ids a page can contain
+
+    def __init__(self):
+        self.tags = {"html", "head", "body"}
+        self.classes = set()
+        self.ids = set()
+
+    def add_html(self, html):
+        self.tags.update(tag.lower() for tag in HTML_TAG_RE.findall(html))
+        for match in CLASS_ATTR_RE.findall(html):
+            self.classes.update(TEMPLATE_TAG_RE.sub(" ", "".join(match)).split())
+        for match in ID_ATTR_RE.findall(html):
+            self.ids.update(TEMPLATE_TAG_RE.sub(" ", "".join(match)).split())
+
+
+def template_source(name):
+    return get_template(name).template.source
+
+
+def page_names(template_name, scripts=()):
+    # names used by a page template, the templates it extends and the partials it includes
+    names = UsedNames()
+    pending = [template_name]
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source = template_source(name)
+        parent = EXTENDS_RE.search(source)
+        if parent:
+            pending.append(parent.group(1))
+            # only what is inside {% block %} tags of a template that extends another one is rendered
+            html = " ".join(BLOCK_RE.findall(source))
+        else:
+            html = source
+        names.add_html(html)
+        pending.extend(INCLUDE_RE.findall(html))
+        if "|safe" in html:
+            names.tags.update(CONTENT_TAGS)
+        if "{{form." in html.replace(" ", ""):
+            names.tags.update(FORM_TAGS)
+    for script in scripts:
+        for match in JS_CLASS_RE.findall(script):
+            names.classes.update(match.split())
+    return names
+
+
+# --- css ---
+
+def _block_end(css, start):
+    # index of the } closing the { at start - 1, skipping quoted strings
+    depth = 1
+    i = start
+    quote = None
+    while i < len(css):
+        char = css[i]
+        if quote:
+            if char == "\\":
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return i
+        i += 1
+    return len(css)
+
+
+def parse_css(css):
+    # Splits a stylesheet into a list of (prelude, body) pairs, body is None for statements like @import.
+    css = COMMENT_RE.sub("", css)
+    rules = []
+    i = 0
+    while i < len(css):
+        brace = css.find("{", i)
+        semicolon = css.find(";", i)
+        prelude_end = brace if brace != -1 else len(css)
+        if css[i:].lstrip().startswith("@") and semicolon != -1 and (brace == -1 or semicolon < brace):
+            rules.append((css[i:semicolon].strip(), None))
+            i = semicolon + 1
+            continue
+        if brace == -1:
+            break
+        end = _block_end(css, brace + 1)
+        rules.append((css[i:prelude_end].strip(), css[brace + 1:end]))
+        i = end + 1
+    return rules
+
+
+FUNCTIONAL_PSEUDO_RE = re.compile(r":(?:not|is|where|has)\((?:[^()]|\([^()]*\))*\)")
+PSEUDO_RE = re.compile(r"::?[a-zA-Z-]+(?:\([^()]*\))?")
+ATTRIBUTE_RE = re.compile(r"\[[^\]]*\]")
+SELECTOR_CLASS_RE = re.compile(r"\.(-?[_a-zA-Z][\w-]*)")
+SELECTOR_ID_RE = re.compile(r"#(-?[_a-zA-Z][\w-]*)")
+SELECTOR_TAG_RE = re.compile(r"(?:^|[\s>+~])([a-zA-Z][a-zA-Z0-9]*)")
+
+
+def selector_used(selector, names):
+    # True when every tag, class and id the selector needs can be on the page.
+    # Pseudo classes (:hover, :not(...)) and attribute selectors are ignored, they do not make a selector need more.
+    simple = ATTRIBUTE_RE.sub("", PSEUDO_RE.sub("", FUNCTIONAL_PSEUDO_RE.sub("", selector)))
+    return (
+        set(SELECTOR_CLASS_RE.findall(simple)) <= names.classes
+        and set(SELECTOR_ID_RE.findall(simple)) <= names.ids
+        and {tag.lower() for tag in SELECTOR_TAG_RE.findall(simple)} <= names.tags
+    )
+
+
+def split_selectors(prelude):
+    # splits "a, b:not(.c, .d)" on the commas that are not inside brackets
+    selectors = []
+    depth = 0
+    current = ""
+    for char in prelude:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        if char == "," and depth == 0:
+            selectors.append(current.strip())
+            current = ""
+        else:
+            current += char
+    selectors.append(current.strip())
+    return [selector for selector in selectors if selector]
+
+
+def critical_rules(css, names):
+    # the rules of css used on a page, as minified css text
+    output = []
+    for prelude, body in parse_css(css):
+        if body is None:
+            # @charset / @import: the imported stylesheet (web fonts) is preloaded instead, see base.html
+            continue
+        if prelude.startswith("@"):
+            keyword = prelude.split(None, 1)[0].split("(", 1)[0].lower()
+            if keyword in ("@media", "@supports"):
+                inner = critical_rules(body, names)
+                if inner:
+                    output.append(f"{_squeeze(prelude)}{{{inner}}}")
+            elif keyword == "@font-face":
+                output.append(f"{prelude}{{{_squeeze(body)}}}")
+            # @keyframes and the like only matter once something animates, the full stylesheet brings them
+            continue
+        selectors = [selector for selector in split_selectors(prelude) if selector_used(selector, names)]
+        if selectors:
+            output.append(f"{','.join(_squeeze(s) for s in selectors)}{{{_squeeze(body).strip(';')}}}")
+    return "".join(output)
+
+
+def _squeeze(text):
+    text = re.sub(r"\s+", " ", text).strip()
+    return re.sub(r"\s*([{};,>])\s*", r"\1", text)
+
+
+# --- build / inline ---
+
+def read_static(path):
+    with open(finders.find(path), encoding="utf-8") as file:
+        return file.read()
+
+
+def build(template_name):
+    # the critical css of one page
+    names = page_names(template_name, [read_static(script) for script in SCRIPTS])
+    return "".join(critical_rules(read_static(stylesheet), names) for stylesheet in STYLESHEETS)
+
+
+def output_path(url_name):
+    # written next to the other stylesheets, in the first STATICFILES_DIRS directory
+    return os.path.join(settings.STATICFILES_DIRS[0], CRITICAL_DIRECTORY, f"{url_name}.css")
+
+
+@functools.lru_cache(maxsize=None)
+def inline_css(url_name):
+    # critical css of the page or None when it was not built, read once per process
+    path = finders.find(f"{CRITICAL_DIRECTORY}/{url_name}.css") if url_name else None
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as file:
+        return file.read()
@@ -0,0 +1,148 @@
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ResumeApp.models import ContactProfile, ContactProfileArchive
+
+FIELDS = ("id", "timestamp", "name", "email", "message", "owner_id")
+# keeps track of the archive file being written, so an interrupted run continues where it stopped
+STATE_FILE = "archive_contacts.state.json"
+
+
+# Management command: python manage.py archive_contacts
+# Enforces CONTACT_RETENTION (settings.py): ContactProfile rows older than DAYS days are copied to the
+# ContactProfileArchive table or to a gzip compressed NDJSON file (one JSON object per line), then deleted.
+# Rows are handled oldest first in small chunks keyed on (timestamp, id), each chunk in its own short transaction,
+# so the contact form can still write in between. Running it again after an interruption continues where it stopped:
+# archived rows are always deleted in the same chunk, and for files the last written (timestamp, id) and the size of
+# the file after that chunk are kept in a state file. A rerun cuts off whatever was written after that size (a chunk
+# whose state was not saved, or a gzip member cut short), so no row is written twice and the file stays readable.
+class Command(BaseCommand):
+    help = "Archive and delete contact messages older than the retention period."
+
+    def add_arguments(self, parser):
+        retention = settings.CONTACT_RETENTION
+        parser.add_argument("--days", type=int, default=retention["DAYS"], help="Keep messages of the last DAYS days.")
+        parser.add_argument("--archive", choices=["table", "file"], default=retention["ARCHIVE"])
+        parser.add_argument("--directory", default=retention["DIRECTORY"], help="Directory of the archive files.")
+        parser.add_argument("--chunk-size", type=int, default=retention["CHUNK_SIZE"])
+        parser.add_argument("--pause", type=float, default=retention["PAUSE"],
+                            help="Seconds to wait between chunks.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the messages that would be archived.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        old = ContactProfile.objects.filter(timestamp__lt=cutoff)
+        if options["dry_run"]:
+            self.stdout.write(f"{old.count()} messages older than {cutoff:%Y-%m-%d %H:%M} would be archived.")
+            return
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        to_file = options["archive"] == "file"
+        if to_file:
+            os.makedirs(options["directory"], exist_ok=True)
+            state_path = os.path.join(options["directory"], STATE_FILE)
+            state = self.load_state(state_path, options["directory"])
+            # saved before anything is written, so even an interruption in the first chunk is continued in this file
+            self.save_state(state_path, state)
+
+        archived = chunks = 0
+        lock_times = []
+        started = time.perf_counter()
+        while True:
+            # uses the (timestamp, id) index; archived rows are deleted, so the oldest remaining rows come first
+            rows = list(old.order_by("timestamp", "id").values(*FIELDS)[:options["chunk_size"]])
+            if not rows:
+                break
+
+            if to_file:
+                # rows up to the saved key were written before an interruption, only their delete is missing
+                new_rows = [row for row in rows if state["id"] is None or not self.is_written(row, state)]
+                if new_rows:
+                    offset = self.append(state["path"], new_rows)
+                    state.update(timestamp=new_rows[-1]["timestamp"], id=new_rows[-1]["id"], offset=offset)
+                    self.save_state(state_path, state)
+
+            # time spent in the write transaction: waiting for the SQLite write lock and holding it
+            lock_started = time.perf_counter()
+            with transaction.atomic():
+                if not to_file:
+                    ContactProfileArchive.objects.bulk_create(
+                        [ContactProfileArchive(**row) for row in rows], ignore_conflicts=True)
+                ContactProfile.objects.filter(id__in=[row["id"] for row in rows]).delete()
+            lock_times.append(time.perf_counter() - lock_started)
+
+            archived += len(rows)
+            chunks += 1
+            if options["verbosity"] > 1:
+                self.stdout.write(f"chunk {chunks}: {len(rows)} rows up to {rows[-1]['timestamp']:%Y-%m-%d %H:%M}")
+            time.sleep(options["pause"])
+
+        if to_file and os.path.exists(state_path):
+            # finished, the next run starts a new archive file
+            os.remove(state_path)
+
+        elapsed = time.perf_counter() - started
+        destination = state["path"] if to_file and archived else "ContactProfileArchive"
+        if not archived:
+            self.stdout.write(f"No messages older than {cutoff:%Y-%m-%d %H:%M}.")
+            return
+        self.stdout.write(
+            f"Archived {archived} messages to {destination} in {chunks} chunks, {elapsed:.2f}s "
+            f"({archived / elapsed:.0f} rows/s). Write lock wait+hold per chunk: "
+            f"avg {sum(lock_times) / len(lock_times) * 1000:.1f} ms, max {max(lock_times) * 1000:.1f} ms.")
+
+    @staticmethod
+    def is_written(row, state):
+        return (row["timestamp"], row["id"]) <= (state["timestamp"], state["id"])
+
+    def load_state(self, state_path, directory):
+        if os.path.exists(state_path):
+            with open(state_path) as state_file:
+                state = json.load(state_file)
+            if state["timestamp"]:
+                state["timestamp"] = parse_datetime(state["timestamp"])
+            self.stdout.write(f"Continuing interrupted run, appending to {state['path']}")
+            self.truncate(state["path"], state.get("offset"))
+            return state
+        name = f"contacts-{timezone.now():%Y%m%d-%H%M%S}.ndjson.gz"
+        return {"path": os.path.join(str(directory), name), "timestamp": None, "id": None, "offset": 0}
+
+    @staticmethod
+    def truncate(path, offset):
+        # drops what an interrupted run appended after the last chunk recorded in the state file
+        if offset is None or not os.path.exists(path) or os.path.getsize(path) <= offset:
+            return
+        with open(path, "r+b") as archive_file:
+            archive_file.truncate(offset)
+            os.fsync(archive_file.fileno())
+
+    @staticmethod
+    def save_state(state_path, state):
+        # written to a temporary file and renamed, so an interruption never leaves half a state file
+        # isoformat keeps the microseconds, the key has to compare exactly with the database
+        timestamp = state["timestamp"].isoformat() if state["timestamp"] else None
+        with open(state_path + ".tmp", "w") as state_file:
+            json.dump(dict(state, timestamp=timestamp), state_file)
+        os.replace(state_path + ".tmp", state_path)
+
+    @staticmethod
+    def append(path, rows):
+        # every chunk is appended as its own gzip member, gzip.open() reads them back as one stream;
+        # returns the size of the file, which is where the next chunk starts
+        with gzip.open(path, "at", encoding="utf-8") as archive_file:
+            for row in rows:
+                archive_file.write(json.dumps(dict(row, timestamp=row["timestamp"].isoformat())) + "\n")
+        # make sure the rows are on disk before they are deleted from the database
+        with open(path, "ab") as archive_file:
+            os.fsync(archive_file.fileno())
+            return archive_file.tell()
@@ -0,0 +1,38 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand
+
+from ResumeApp.critical_css import PAGES, STYLESHEETS, build, output_path, read_static
+
+
+# Management command: python manage.py build_critical_css
+# Writes the critical css of every page to static/css/critical/<url name>.css (see ResumeApp/critical_css.py).
+# Run it after changing the templates or the stylesheets and commit the result; run collectstatic afterwards as usual.
+# --report compares the css the browser has to download before it can paint, before and after.
+class Command(BaseCommand):
+    help = "Extract the css rules every page uses from bootstrap.min.css and style.css, to inline them in <head>."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page", action="append", choices=sorted(PAGES),
+                            help="Only build this page (url name), can be given several times.")
+        parser.add_argument("--report", action="store_true",
+                            help="Print the render-blocking css bytes (raw / gzipped) of every page before and after.")
+
+    def handle(self, *args, **options):
+        blocking = "".join(read_static(stylesheet) for stylesheet in STYLESHEETS)
+        for url_name in options["page"] or PAGES:
+            css = build(PAGES[url_name])
+            path = output_path(url_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(css)
+            self.stdout.write(f"{url_name}: {len(css) / 1024:.1f} KB -> {path}")
+            if options["report"]:
+                # before: both stylesheets block rendering, after: only the inlined css does
+                # (the swiper stylesheet and the web fonts come from other hosts and are not counted in either)
+                self.stdout.write(f"  render-blocking css before {self.size(blocking)}, after {self.size(css)}")
+
+    def size(self, css):
+        data = css.encode()
+        return f"{len(data) / 1024:.1f} KB ({len(gzip.compress(data)) / 1024:.1f} KB gzipped)"
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ResumeApp.models import Blog, Portfolio
+from ResumeApp.related import TOP_K, rebuild_related
+
+
+# Management command: python manage.py build_related
+# Recomputes the "related posts" shown on the blog and portfolio detail pages.
+# Saving a post only flags it as stale, this command is the background job that does the actual work in batches.
+# Run it from cron (e.g. every few minutes), or keep it running with --interval.
+class Command(BaseCommand):
+    help = "Recompute the related posts of stale (or, with --full, all) blogs and portfolios."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every post, not only the stale ones.")
+        parser.add_argument("--top-k", type=int, default=TOP_K, help="Number of related posts stored per post.")
+        parser.add_argument("--model", choices=["blog", "portfolio"], help="Only rebuild one kind of post.")
+        parser.add_argument("--interval", type=float, default=0,
+                            help="Keep running and check for stale posts every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        models = [Blog, Portfolio]
+        if options["model"]:
+            models = [Blog if options["model"] == "blog" else Portfolio]
+
+        while True:
+            for model in models:
+                started = time.perf_counter()
+                count = rebuild_related(model, full=options["full"], k=options["top_k"])
+                if count or options["verbosity"] > 1:
+                    self.stdout.write(f"{model._meta.verbose_name_plural}: recomputed {count} posts "
+                                      f"in {time.perf_counter() - started:.2f}s")
+            if not options["interval"]:
+                break
+            # after the first pass only the stale posts need looking at
+            options["full"] = False
+            time.sleep(options["interval"])
@@ -0,0 +1,70 @@
+import os
+import time
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from ResumeApp.storage import CAS_DIRECTORY, TEMP_DIRECTORY, file_fields, is_content_name
+
+
+# Management command: python manage.py media_gc
+# Counts how many rows reference every content-addressed file and removes the files nobody references any more.
+# Files younger than --min-age are kept, an upload is written before the row pointing at it is saved.
+# Left-over files in cas/tmp/ (uploads interrupted while being written) are removed after --tmp-age.
+class Command(BaseCommand):
+    help = "Remove content-addressed media files that are no longer referenced by any row."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed.")
+        parser.add_argument("--min-age", type=float, default=24,
+                            help="Hours a file must be old before it can be removed (default 24).")
+        parser.add_argument("--tmp-age", type=float, default=1,
+                            help="Hours after which an unfinished upload in cas/tmp/ is removed (default 1).")
+
+    def handle(self, *args, **options):
+        # files touched after this (uploads of content that is already stored, see storage.py) are kept,
+        # the references counted below may not include the row that is using them again
+        started = time.time()
+        references = Counter()
+        for model, field in file_fields():
+            names = model._default_manager.exclude(**{field.name: ""}).exclude(**{field.name + "__isnull": True})
+            references.update(name for name in names.values_list(field.name, flat=True) if is_content_name(name))
+
+        cutoff = time.time() - options["min_age"] * 3600
+        tmp_cutoff = time.time() - options["tmp_age"] * 3600
+        root = default_storage.path(CAS_DIRECTORY)
+        kept = removed = freed = 0
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                full_path = os.path.join(directory, file_name)
+                name = os.path.relpath(full_path, default_storage.location).replace(os.sep, "/")
+                try:
+                    modified = os.path.getmtime(full_path)
+                    size = os.path.getsize(full_path)
+                except FileNotFoundError:
+                    continue
+                if name.startswith(TEMP_DIRECTORY + "/"):
+                    # an upload being written (or interrupted), no row can point at it; uploads are written in one go,
+                    # so one that has not been touched for --tmp-age hours is not coming back
+                    keep = modified > tmp_cutoff
+                else:
+                    keep = references[name] or modified > cutoff or modified >= started
+                if keep:
+                    kept += 1
+                    continue
+                # checked again right before removing it, in case it was uploaded again during the walk
+                if not options["dry_run"]:
+                    try:
+                        if os.path.getmtime(full_path) != modified:
+                            kept += 1
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    default_storage.purge(name)
+                removed += 1
+                freed += size
+
+        action = "Would remove" if options["dry_run"] else "Removed"
+        self.stdout.write(f"{action} {removed} orphaned files ({freed / 1024 / 1024:.1f} MB), kept {kept} "
+                          f"({sum(references.values())} references to {len(references)} files).")
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand
+
+from ResumeApp.storage import file_fields, is_content_name
+from ResumeApp.surrogate import purger
+
+
+# Management command: python manage.py media_migrate
+# Moves media uploaded before ContentAddressedStorage was enabled into the content-addressed layout:
+# every file is hashed and stored once under cas/, the rows are pointed at the new name and the old file is removed.
+# It can be run again safely, rows already pointing at cas/ are skipped.
+# Rows are saved (only the file field), so signals.py purges the cached pages showing them and drops them from the
+# slug cache, before the old files are removed. Worker processes without a shared slug cache (slug_cache.py) may show
+# the old file name until their TTL, use --keep-old and remove the old files later if that matters.
+class Command(BaseCommand):
+    help = "Move existing media files into the content-addressed (deduplicated) layout."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated.")
+        parser.add_argument("--keep-old", action="store_true", help="Do not remove the old files.")
+
+    def handle(self, *args, **options):
+        migrated = missing = 0
+        # old name -> new name, several rows can share an old file and it is stored only once
+        moved = {}
+        storages = {}
+        for model, field in file_fields():
+            storage = field.storage
+            rows = model._default_manager.exclude(**{field.name: ""}).exclude(**{field.name + "__isnull": True})
+            for pk, name in rows.values_list("pk", field.name).iterator():
+                if is_content_name(name):
+                    continue
+                if name not in moved:
+                    if not storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f"{model.__name__} {pk}: {name} does not exist, skipped")
+                        continue
+                    storages[name] = storage
+                    if options["dry_run"]:
+                        moved[name] = name
+                    else:
+                        with storage.open(name) as old_file:
+                            moved[name] = storage.save(name, old_file)
+                migrated += 1
+                if not options["dry_run"]:
+                    # save(update_fields=...) only writes the file field, but sends post_save for the purges
+                    obj = model._default_manager.get(pk=pk)
+                    setattr(obj, field.name, moved[name])
+                    obj.save(update_fields=[field.name])
+
+        if not options["dry_run"] and not options["keep_old"]:
+            # the pages are purged before the files they pointed at go
+            purger.flush()
+            for old_name, storage in storages.items():
+                storage.purge(old_name)
+
+        new_files = len(set(moved.values()))
+        self.stdout.write(f"Migrated {migrated} references from {len(moved)} files into {new_files} "
+                          f"content-addressed files, {missing} missing.")
@@ -0,0 +1,53 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+
+MIDDLEWARE_PATH = "ResumeApp.profiling.SamplingProfilerMiddleware"
+
+
+# Management command: python manage.py profile_overhead
+# Measures what SamplingProfilerMiddleware costs a request that is not profiled: the same page is requested
+# through the whole Django stack (test client, no network) with and without the middleware, in alternating rounds
+# so both see the same database and machine load, and the median time per request of each is printed.
+# Profiling itself is switched off for the run (SAMPLE_RATE 0, no URL_NAMES), only the off path is measured.
+class Command(BaseCommand):
+    help = "Benchmark the per-request overhead of the sampling profiler middleware when it does not profile."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="/blog/", help="Page to request (default /blog/).")
+        parser.add_argument("--requests", type=int, default=200, help="Requests per round (default 200).")
+        parser.add_argument("--rounds", type=int, default=10, help="Rounds with and without (default 10).")
+
+    def handle(self, *args, **options):
+        if MIDDLEWARE_PATH not in settings.MIDDLEWARE:
+            raise CommandError(f"{MIDDLEWARE_PATH} is not in MIDDLEWARE")
+        profiler_off = dict(getattr(settings, "PROFILER", {}), SAMPLE_RATE=0.0, URL_NAMES=[])
+        variants = {
+            "with": list(settings.MIDDLEWARE),
+            "without": [middleware for middleware in settings.MIDDLEWARE if middleware != MIDDLEWARE_PATH],
+        }
+
+        timings = {name: [] for name in variants}
+        for _ in range(options["rounds"]):
+            for name, middleware in variants.items():
+                with override_settings(MIDDLEWARE=middleware, PROFILER=profiler_off,
+                                       ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ["testserver"]):
+                    # a new client loads the middleware of the current settings
+                    client = Client()
+                    response = client.get(options["url"])
+                    if response.status_code != 200:
+                        raise CommandError(f"{options['url']} returned {response.status_code}")
+                    started = time.perf_counter()
+                    for _ in range(options["requests"]):
+                        client.get(options["url"])
+                    timings[name].append((time.perf_counter() - started) / options["requests"] * 1e6)
+
+        for name, values in timings.items():
+            self.stdout.write(f"{name:>7} profiler middleware: {statistics.median(values):8.1f} µs/request "
+                              f"(min {min(values):.1f}, max {max(values):.1f})")
+        difference = statistics.median(timings["with"]) - statistics.median(timings["without"])
+        self.stdout.write(f"overhead: {difference:+.1f} µs/request")
@@ -0,0 +1,57 @@
+import glob
+import os
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ResumeApp.profiling import profiler_setting
+
+
+# Management command: python manage.py profile_stacks > blog.collapsed
+# Merges the collapsed-stack files written by SamplingProfilerMiddleware in every worker process
+# (including the rotated stacks-<pid>.collapsed.1, .2 ... files) into one collapsed-stack file,
+# which can be turned into a flamegraph with flamegraph.pl or opened in https://www.speedscope.app
+class Command(BaseCommand):
+    help = "Merge the sampled stacks of all worker processes into one collapsed-stack (flamegraph) file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--directory", default=None, help="Directory with the stacks files (PROFILER DIRECTORY).")
+        parser.add_argument("--url-name", help='Only stacks of one page, e.g. "ResumeApp:blog".')
+        parser.add_argument("--output", help="Write to this file instead of stdout.")
+        parser.add_argument("--top", type=int, default=0,
+                            help="Instead of the stacks, print the N functions most often seen on top of the stack.")
+
+    def handle(self, *args, **options):
+        directory = options["directory"] or profiler_setting("DIRECTORY")
+        files = glob.glob(os.path.join(directory, "stacks-*.collapsed*"))
+        if not files:
+            raise CommandError(f"No stacks files in {directory}")
+
+        stacks = Counter()
+        for path in files:
+            with open(path) as stacks_file:
+                for line in stacks_file:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if not stack or not count.isdigit():
+                        continue
+                    if options["url_name"] and stack.split(";", 1)[0] != options["url_name"]:
+                        continue
+                    stacks[stack] += int(count)
+
+        if options["top"]:
+            leaves = Counter()
+            for stack, count in stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+            total = sum(leaves.values()) or 1
+            lines = [f"{count * 100 / total:6.2f}% {count:8d}  {leaf}"
+                     for leaf, count in leaves.most_common(options["top"])]
+        else:
+            lines = [f"{stack} {count}" for stack, count in sorted(stacks.items())]
+
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.writelines(line + "\n" for line in lines)
+            self.stderr.write(f"{sum(stacks.values())} samples from {len(files)} files written to {options['output']}")
+        else:
+            for line in lines:
+                self.stdout.write(line)
@@ -0,0 +1,47 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+# Management command: python manage.py purge_receiver
+# A stand-in for the CDN purge API, to try surrogate key purging without a real shared cache:
+# set SURROGATE_PURGE["ENDPOINT"] to "http://127.0.0.1:8081/purge", run this command and edit something in the admin.
+# Every purge request received is printed with its keys.
+class Command(BaseCommand):
+    help = "Run a local endpoint that receives and prints surrogate key purge requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8081)
+
+    def handle(self, *args, **options):
+        command = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                try:
+                    keys = json.loads(body)["surrogate_keys"]
+                except (ValueError, KeyError, TypeError):
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+                command.stdout.write(f"{self.path}: purge {len(keys)} keys: {' '.join(keys)}")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps({"status": "ok"}).encode())
+
+            # the default logs every request to stderr, the line above already says what happened
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), Handler)
+        self.stdout.write(f"Receiving purges on http://{options['host']}:{options['port']}/ (CONTROL-C to quit)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
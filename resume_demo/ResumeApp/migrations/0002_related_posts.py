@@ -0,0 +1,64 @@
+# Generated by Django 4.1.1 on 2026-10-19 13:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blog',
+            name='related_stale',
+            field=models.BooleanField(db_index=True, default=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='portfolio',
+            name='related_stale',
+            field=models.BooleanField(db_index=True, default=True, editable=False),
+        ),
+        migrations.CreateModel(
+            name='RelatedPortfolio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='ResumeApp.portfolio')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='ResumeApp.portfolio')),
+            ],
+            options={
+                'verbose_name': 'Related Portfolio',
+                'verbose_name_plural': 'Related Portfolios',
+                'ordering': ['rank'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedBlog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='ResumeApp.blog')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='ResumeApp.blog')),
+            ],
+            options={
+                'verbose_name': 'Related Blog',
+                'verbose_name_plural': 'Related Blogs',
+                'ordering': ['rank'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedportfolio',
+            index=models.Index(fields=['source', 'rank'], name='ResumeApp_r_source__b7dfd6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='relatedblog',
+            index=models.Index(fields=['source', 'rank'], name='ResumeApp_r_source__73e118_idx'),
+        ),
+    ]
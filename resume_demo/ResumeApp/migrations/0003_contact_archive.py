@@ -0,0 +1,33 @@
+# Generated by Django 4.1.1 on 2026-10-19 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0002_related_posts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContactProfileArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('timestamp', models.DateTimeField()),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('email', models.EmailField(max_length=254, verbose_name='Email')),
+                ('message', models.TextField(verbose_name='Message')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Contact Profile',
+                'verbose_name_plural': 'Archived Contact Profiles',
+                'ordering': ['timestamp'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='contactprofile',
+            index=models.Index(fields=['timestamp', 'id'], name='ResumeApp_c_timesta_9804f0_idx'),
+        ),
+    ]
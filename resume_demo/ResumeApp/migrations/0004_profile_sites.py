@@ -0,0 +1,70 @@
+# Generated by Django 4.1.1 on 2026-10-19 13:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_owner(apps, schema_editor):
+    # before this migration the site showed the profile of the first user, so existing content belongs to it
+    UserProfile = apps.get_model('ResumeApp', 'UserProfile')
+    profile = UserProfile.objects.order_by('user_id').first()
+    if profile is None:
+        return
+    for model_name in ('Blog', 'Portfolio', 'Testimonial', 'Certificate'):
+        apps.get_model('ResumeApp', model_name).objects.filter(owner__isnull=True).update(owner=profile)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0003_contact_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileSite',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('host', models.CharField(blank=True, help_text='Host name without port, e.g. jane.example.com', max_length=253, null=True, unique=True)),
+                ('prefix', models.SlugField(blank=True, help_text='First part of the path, e.g. jane for example.com/jane/', max_length=100, null=True, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Profile Site',
+                'verbose_name_plural': 'Profile Sites',
+            },
+        ),
+        migrations.AddField(
+            model_name='blog',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AddField(
+            model_name='portfolio',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AddField(
+            model_name='testimonial',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='blog',
+            index=models.Index(fields=['owner', 'slug'], name='ResumeApp_b_owner_i_e3565e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolio',
+            index=models.Index(fields=['owner', 'slug'], name='ResumeApp_p_owner_i_51048d_idx'),
+        ),
+        migrations.AddField(
+            model_name='profilesite',
+            name='profile',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sites', to='ResumeApp.userprofile'),
+        ),
+        migrations.RunPython(set_owner, migrations.RunPython.noop),
+    ]
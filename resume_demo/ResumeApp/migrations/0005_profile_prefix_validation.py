@@ -0,0 +1,19 @@
+# Generated by Django 4.1.1 on 2026-10-19 13:55
+
+import ResumeApp.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0004_profile_sites'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profilesite',
+            name='prefix',
+            field=models.SlugField(blank=True, help_text='First part of the path, e.g. jane for example.com/jane/', max_length=100, null=True, unique=True, validators=[ResumeApp.models.validate_prefix]),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def set_owner(apps, schema_editor):
+    # rows saved without an owner since 0004 (shell, fixtures), or all of them when 0004 ran before any profile
+    # existed, belong to the profile the site shows by default: the one of the first user
+    UserProfile = apps.get_model('ResumeApp', 'UserProfile')
+    profile = UserProfile.objects.order_by('user_id').first()
+    for model_name in ('Blog', 'Portfolio', 'Testimonial', 'Certificate'):
+        rows = apps.get_model('ResumeApp', model_name).objects.filter(owner__isnull=True)
+        if profile is None:
+            if rows.exists():
+                raise RuntimeError(f'{model_name} rows have no owner and there is no user profile to give them to, '
+                                   f'create a user first (python manage.py createsuperuser).')
+            continue
+        rows.update(owner=profile)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0005_profile_prefix_validation'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0006_set_missing_owner'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='blog',
+            name='owner',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AlterField(
+            model_name='certificate',
+            name='owner',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AlterField(
+            model_name='portfolio',
+            name='owner',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AlterField(
+            model_name='testimonial',
+            name='owner',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+    ]
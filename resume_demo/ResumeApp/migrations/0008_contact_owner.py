@@ -0,0 +1,38 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def set_owner(apps, schema_editor):
+    # messages (and archived ones) received before contacts had an owner were sent to the profile the site showed
+    # by default: the one of the first user
+    UserProfile = apps.get_model('ResumeApp', 'UserProfile')
+    profile = UserProfile.objects.order_by('user_id').first()
+    for model_name in ('ContactProfile', 'ContactProfileArchive'):
+        rows = apps.get_model('ResumeApp', model_name).objects.filter(owner__isnull=True)
+        if profile is None:
+            if rows.exists():
+                raise RuntimeError(f'{model_name} rows have no owner and there is no user profile to give them to, '
+                                   f'create a user first (python manage.py createsuperuser).')
+            continue
+        rows.update(owner=profile)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0007_owner_required'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactprofile',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AddField(
+            model_name='contactprofilearchive',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.RunPython(set_owner, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ResumeApp', '0008_contact_owner'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contactprofile',
+            name='owner',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+        migrations.AlterField(
+            model_name='contactprofilearchive',
+            name='owner',
+            field=models.ForeignKey(blank=True, on_delete=django.db.models.deletion.CASCADE, to='ResumeApp.userprofile'),
+        ),
+    ]
@@ -8,6 +8,10 @@ from django.contrib.auth.models import User
 from django.template.defaultfilters import slugify
 # can add rich text filed to our blog and profile
 from ckeditor.fields import RichTextField
+from urllib.parse import urlparse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.urls import Resolver404, resolve
 
 
 # for coding and key skills columns in index profile page
@@ -79,6 +83,58 @@ class UserProfile(models.Model):
         return f'{self.user.first_name} {self.user.last_name}'
 
 
+# first parts of the path that are never a profile prefix, besides the ones urls.py routes (admin, blog, contact ...)
+RESERVED_PREFIXES = {"static", "media"}
+
+
+# True when example.com/<prefix>/ is (or may become) a page of the site itself, e.g. admin, blog or cache-stats,
+# such a prefix would hide that page
+def is_reserved_prefix(prefix):
+    # STATIC_URL / MEDIA_URL are only routed by urls.py with DEBUG on, and may be full urls of another host
+    reserved = RESERVED_PREFIXES | {urlparse(url).path.strip("/").split("/")[0]
+                                    for url in (settings.STATIC_URL, settings.MEDIA_URL) if url}
+    if prefix in reserved:
+        return True
+    for path in (f"/{prefix}/", f"/{prefix}"):
+        try:
+            resolve(path)
+            return True
+        except Resolver404:
+            pass
+    return False
+
+
+def validate_prefix(prefix):
+    if prefix and is_reserved_prefix(prefix):
+        raise ValidationError(f'"{prefix}" is used by the site itself and can not be a profile prefix.')
+
+
+# Which profile (resume) a request is for, so one deployment can serve many profiles (see ResumeApp/tenancy.py).
+# A profile is found by the host name of the request (jane.example.com) or by the first part of its path
+# (example.com/jane/...). Requests matching no row show the first profile.
+class ProfileSite(models.Model):
+
+    profile = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name="sites")
+    # unique=True also creates the index the lookup uses
+    host = models.CharField(max_length=253, unique=True, blank=True, null=True,
+                            help_text="Host name without port, e.g. jane.example.com")
+    prefix = models.SlugField(max_length=100, unique=True, blank=True, null=True, validators=[validate_prefix],
+                              help_text="First part of the path, e.g. jane for example.com/jane/")
+
+    class Meta:
+        verbose_name_plural = 'Profile Sites'
+        verbose_name = 'Profile Site'
+
+    def save(self, *args, **kwargs):
+        # host names are not case sensitive, they are looked up in lower case
+        if self.host:
+            self.host = self.host.lower()
+        super(ProfileSite, self).save(*args, **kwargs)
+
+    def __str__(self):
+        return self.host or f'/{self.prefix}/'
+
+
 # For contact Page
 class ContactProfile(models.Model):
 
@@ -86,6 +142,8 @@ class ContactProfile(models.Model):
     name = models.CharField(verbose_name="Name", max_length=100)
     email = models.EmailField(verbose_name="Email")
     message = models.TextField(verbose_name="Message")
+    # the profile the message was sent to (request.profile_id of the contact page, see tenancy.py)
+    owner = models.ForeignKey('UserProfile', on_delete=models.CASCADE, blank=True)
 
     class Meta:
         verbose_name_plural = 'Contact Profiles'
@@ -101,6 +159,30 @@ class ContactProfile(models.Model):
         # in the results. For example, if a name field isn’t unique, ordering by it won’t guarantee objects with the
         # same name always appear in the same order.
         ordering = ["timestamp"]
+        # the archive_contacts command walks old rows in (timestamp, id) order, chunk by chunk
+        indexes = [models.Index(fields=["timestamp", "id"])]
+
+    def __str__(self):
+        return f'{self.name}'
+
+
+# ContactProfile rows older than the retention period are moved here by the archive_contacts command,
+# (unless it archives to a compressed file instead), so the contact table stays small.
+class ContactProfileArchive(models.Model):
+
+    # same id as the ContactProfile row it was
+    id = models.BigIntegerField(primary_key=True)
+    timestamp = models.DateTimeField()
+    name = models.CharField(verbose_name="Name", max_length=100)
+    email = models.EmailField(verbose_name="Email")
+    message = models.TextField(verbose_name="Message")
+    owner = models.ForeignKey('UserProfile', on_delete=models.CASCADE, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = 'Archived Contact Profiles'
+        verbose_name = 'Archived Contact Profile'
+        ordering = ["timestamp"]
 
     def __str__(self):
         return f'{self.name}'
@@ -115,6 +197,9 @@ class Testimonial(models.Model):
     quote = models.CharField(max_length=500, blank=True, null=True)
     # if true would show the person's testimonial otherwise not
     is_active = models.BooleanField(default=True)
+    # profile (resume) this testimonial is shown on, see ProfileSite; required, blank=True only lets the admin leave
+    # it empty, which then means the profile of the admin user saving it (admin.OwnedAdmin)
+    owner = models.ForeignKey('UserProfile', on_delete=models.CASCADE, blank=True)
 
     class Meta:
         verbose_name_plural = 'Testimonials'
@@ -169,6 +254,10 @@ class Portfolio(models.Model):
     # it is created from the title by down-casing all letters, and replacing spaces by hyphens -
     slug = models.SlugField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
+    owner = models.ForeignKey('UserProfile', on_delete=models.CASCADE, blank=True)
+    # True when the "related posts" of this portfolio need recomputing (see ResumeApp/related.py),
+    # picked up in batches by the build_related management command
+    related_stale = models.BooleanField(default=True, editable=False, db_index=True)
 
     def save(self, *args, **kwargs):
         # we slugify i.e. all letters become small-case and spaces join and become _
@@ -177,12 +266,16 @@ class Portfolio(models.Model):
         if not self.id:
             # need to call slugify function to create slug field in Django
             self.slug = slugify(self.name)
+        # any edit may change the text the related posts are computed from
+        self.related_stale = True
         super(Portfolio, self).save(*args, **kwargs)
 
     class Meta:
         verbose_name_plural = 'Portfolio Profiles'
         verbose_name = 'Portfolio'
         ordering = ["name"]
+        # detail pages look a portfolio up by slug within one profile
+        indexes = [models.Index(fields=["owner", "slug"])]
 
     def __str__(self):
         return self.name
@@ -205,16 +298,20 @@ class Blog(models.Model):
     slug = models.SlugField(null=True, blank=True)
     image = models.ImageField(blank=True, null=True, upload_to="blog")
     is_active = models.BooleanField(default=True)
+    owner = models.ForeignKey('UserProfile', on_delete=models.CASCADE, blank=True)
+    related_stale = models.BooleanField(default=True, editable=False, db_index=True)
 
     def save(self, *args, **kwargs):
         if not self.id:
             self.slug = slugify(self.name)
+        self.related_stale = True
         super(Blog, self).save(*args, **kwargs)
 
     class Meta:
         verbose_name_plural = 'Blog Profiles'
         verbose_name = 'Blog'
         ordering = ["timestamp"]
+        indexes = [models.Index(fields=["owner", "slug"])]
 
     def __str__(self):
         return self.name
@@ -232,6 +329,7 @@ class Certificate(models.Model):
     title = models.CharField(max_length=200, blank=True, null=True)
     description = models.CharField(max_length=500, blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    owner = models.ForeignKey('UserProfile', on_delete=models.CASCADE, blank=True)
 
     class Meta:
         verbose_name_plural = 'Certificates'
@@ -239,3 +337,47 @@ class Certificate(models.Model):
 
     def __str__(self):
         return self.name
+
+
+# "Related posts" side tables, filled by ResumeApp/related.py.
+# Each row says: target is the rank-th most similar post to source (cosine similarity of TF-IDF vectors).
+# abstract = True means no table is created for this class, it only shares its fields with the subclasses.
+class RelatedContent(models.Model):
+
+    score = models.FloatField()
+    # 0 is the most similar
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        abstract = True
+        ordering = ["rank"]
+
+
+class RelatedPortfolio(RelatedContent):
+
+    source = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name="related_links")
+    # related_name="related_to" lets the detail view do Portfolio.objects.filter(related_to__source=...)
+    target = models.ForeignKey(Portfolio, on_delete=models.CASCADE, related_name="related_to")
+
+    class Meta(RelatedContent.Meta):
+        verbose_name_plural = 'Related Portfolios'
+        verbose_name = 'Related Portfolio'
+        # the detail page looks neighbours up by (source, rank), so one index serves the whole query
+        indexes = [models.Index(fields=["source", "rank"])]
+
+    def __str__(self):
+        return f'{self.source_id} -> {self.target_id}'
+
+
+class RelatedBlog(RelatedContent):
+
+    source = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name="related_links")
+    target = models.ForeignKey(Blog, on_delete=models.CASCADE, related_name="related_to")
+
+    class Meta(RelatedContent.Meta):
+        verbose_name_plural = 'Related Blogs'
+        verbose_name = 'Related Blog'
+        indexes = [models.Index(fields=["source", "rank"])]
+
+    def __str__(self):
+        return f'{self.source_id} -> {self.target_id}'
@@ -0,0 +1,185 @@
+# On-demand sampling profiler for live requests (SamplingProfilerMiddleware in settings.py).
+#
+# A request is profiled when one of these is true (see PROFILER in settings.py):
+#   - random() < SAMPLE_RATE (a fraction of all requests, 0 = off)
+#   - its url name is listed in URL_NAMES, e.g. "ResumeApp:blog"
+#   - it carries a PROFILER["HEADER"] header with a token made by make_profile_token() for a staff user
+#
+# While a request is profiled a background thread looks at the request's call stack every INTERVAL seconds
+# (sys._current_frames()), so the view, ORM queries and template rendering are seen without tracing every call.
+# The stacks are written in the collapsed-stack format used by flamegraph.pl / speedscope:
+#   ResumeApp:blog;django.core.handlers.base:_get_response;ResumeApp.views:get_context_data 12
+# one file per worker process (stacks-<pid>.collapsed) rotated by size.
+# python manage.py profile_stacks merges the files of all workers.
+#
+# When a request is not profiled the middleware only does a random() and a dict lookup,
+# python manage.py profile_overhead measures what that costs per request.
+import logging
+import logging.handlers
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+
+# salt of the signed header tokens, a token signed for something else can not be used here
+TOKEN_SALT = "ResumeApp.profiling"
+
+DEFAULTS = {
+    "SAMPLE_RATE": 0.0,
+    "URL_NAMES": [],
+    "HEADER": "X-Profile-Token",
+    # seconds a header token stays valid
+    "TOKEN_MAX_AGE": 3600,
+    "INTERVAL": 0.005,
+    "DIRECTORY": os.path.join(settings.BASE_DIR, "profiles"),
+    "MAX_BYTES": 10 * 1024 * 1024,
+    "BACKUP_COUNT": 5,
+}
+
+
+def profiler_setting(name):
+    return getattr(settings, "PROFILER", {}).get(name, DEFAULTS[name])
+
+
+def make_profile_token(user):
+    # token for the profiling header, e.g. in python manage.py shell:
+    #   make_profile_token(User.objects.get(username="admin"))
+    # and then: curl -H "X-Profile-Token: <token>" https://.../blog/some-post
+    return signing.dumps(user.pk, salt=TOKEN_SALT)
+
+
+def _frame_label(frame):
+    return f'{frame.f_globals.get("__name__", "?")}:{frame.f_code.co_name}'
+
+
+def collapse_stack(frame):
+    # outermost frame first, separated by ;
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class Sampler(threading.Thread):
+    # One sampler thread per process, sleeping while no request is profiled.
+
+    def __init__(self, interval):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.interval = interval
+        # thread id of a profiled request -> Counter of its collapsed stacks
+        self.targets = {}
+        self.wakeup = threading.Event()
+
+    def start_sampling(self, thread_id):
+        stacks = Counter()
+        self.targets[thread_id] = stacks
+        self.wakeup.set()
+        return stacks
+
+    def stop_sampling(self, thread_id):
+        return self.targets.pop(thread_id, Counter())
+
+    def run(self):
+        while True:
+            if not self.targets:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            for thread_id, stacks in list(self.targets.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stacks[collapse_stack(frame)] += 1
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+# the output logger is made per process id, worker processes forked from one parent each get their own file
+_output = {}
+# two requests finishing at once would otherwise both add a handler, and every line would be written twice
+_output_lock = threading.Lock()
+
+
+def get_sampler():
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = Sampler(profiler_setting("INTERVAL"))
+            _sampler.start()
+        return _sampler
+
+
+def get_output():
+    pid = os.getpid()
+    output = _output.get(pid)
+    if output is not None:
+        return output
+    with _output_lock:
+        if pid in _output:
+            return _output[pid]
+        directory = profiler_setting("DIRECTORY")
+        os.makedirs(directory, exist_ok=True)
+        handler = logging.handlers.RotatingFileHandler(
+            os.path.join(directory, f"stacks-{pid}.collapsed"),
+            maxBytes=profiler_setting("MAX_BYTES"), backupCount=profiler_setting("BACKUP_COUNT"))
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        output = logging.getLogger(f"{__name__}.{pid}")
+        output.propagate = False
+        output.setLevel(logging.INFO)
+        output.addHandler(handler)
+        _output[pid] = output
+        return output
+
+
+def write_stacks(view_name, stacks):
+    output = get_output()
+    for stack, count in stacks.items():
+        # the url name is the root frame, so profile_stacks can show one page at a time
+        output.info("%s;%s %d", view_name, stack, count)
+
+
+class SamplingProfilerMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = profiler_setting("SAMPLE_RATE")
+        self.url_names = set(profiler_setting("URL_NAMES"))
+        # request.META keys are HTTP_ + upper case header name with - replaced by _
+        self.header = "HTTP_" + profiler_setting("HEADER").upper().replace("-", "_")
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # set by process_view when this request is profiled, the response is fully rendered at this point
+        thread_id = getattr(request, "_profiling_thread", None)
+        if thread_id is not None:
+            stacks = get_sampler().stop_sampling(thread_id)
+            write_stacks(request.resolver_match.view_name, stacks)
+        return response
+
+    # called just before the view, when the url name is known
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not (
+            (self.sample_rate and random.random() < self.sample_rate)
+            or request.resolver_match.view_name in self.url_names
+            or (self.header in request.META and self.is_staff_token(request.META[self.header]))
+        ):
+            return None
+        request._profiling_thread = threading.get_ident()
+        get_sampler().start_sampling(request._profiling_thread)
+        return None
+
+    def is_staff_token(self, token):
+        try:
+            user_id = signing.loads(token, salt=TOKEN_SALT, max_age=profiler_setting("TOKEN_MAX_AGE"))
+        except signing.BadSignature:
+            return False
+        return User.objects.filter(pk=user_id, is_staff=True, is_active=True).exists()
@@ -0,0 +1,196 @@
+# "Related posts" for the blog and portfolio detail pages.
+#
+# Every active post is turned into a TF-IDF vector (term frequency * inverse document frequency) built from its
+# name, description and the text of its body with the html tags stripped off.
+# Two posts are similar when the cosine of the angle between their vectors is high.
+# Because every row is normalised to length 1, the cosine is just the dot product, so the similarity of a block of
+# posts against all posts is one sparse matrix multiplication (block @ all.T) instead of a Python loop over pairs.
+# The top-k neighbours of each post are stored in the RelatedBlog / RelatedPortfolio side tables,
+# so the detail pages only need one indexed query to show them.
+# Posts are only related to posts of the same profile (their owner, see tenancy.py), each owner is computed on its own.
+import html
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils.html import strip_tags
+
+from .models import Blog, Portfolio, RelatedBlog, RelatedPortfolio
+from .surrogate import model_key, purger
+
+# number of neighbours stored for every post
+TOP_K = 5
+# rows of the similarity matrix computed at a time, keeps a block of CHUNK_ROWS x posts float32 scores in memory
+CHUNK_ROWS = 256
+# ids per "id IN (...)" query, stays below the SQLite variable limit
+ID_BATCH = 500
+# words of at least two letters/digits
+TOKEN_RE = re.compile(r"[^\W_]{2,}")
+
+# model -> side table the neighbours are stored in
+LINK_MODELS = {
+    Blog: RelatedBlog,
+    Portfolio: RelatedPortfolio,
+}
+
+
+def document_text(name, description, body):
+    # body comes from ckeditor so it is html, strip_tags removes the tags and unescape turns &amp; into & etc.
+    body = html.unescape(strip_tags(body or ""))
+    return " ".join(part for part in (name, description, body) if part)
+
+
+def tfidf_matrix(texts):
+    # Build a sparse (documents x terms) matrix in CSR form directly from the token counts:
+    # indptr[i]:indptr[i + 1] are the positions in indices/data that belong to document i.
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    counts = []
+    for text in texts:
+        for term, count in Counter(TOKEN_RE.findall(text.lower())).items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    n_docs = len(texts)
+    indices = np.asarray(indices, dtype=np.int32)
+    counts = np.asarray(counts, dtype=np.float32)
+    # document frequency: in how many documents each term appears
+    df = np.bincount(indices, minlength=len(vocabulary))
+    # smoothed idf, same formula as scikit-learn's TfidfVectorizer
+    idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+    # sublinear tf so a word repeated 50 times does not count 50 times as much
+    data = (1 + np.log(counts)) * idf[indices]
+
+    matrix = sparse.csr_matrix((data, indices, np.asarray(indptr)), shape=(n_docs, len(vocabulary)),
+                               dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    # empty documents keep a zero vector instead of dividing by zero
+    norms[norms == 0] = 1
+    return sparse.csr_matrix(sparse.diags(1 / norms) @ matrix)
+
+
+def top_k_neighbours(matrix, rows, k=TOP_K, chunk_rows=CHUNK_ROWS):
+    # Yields (row, neighbour rows, scores) for every row in rows, best neighbour first.
+    # Rows without any shared term with another document get no neighbours.
+    transposed = sparse.csr_matrix(matrix.T)
+    n_docs = matrix.shape[0]
+    rows = np.asarray(rows, dtype=np.int64)
+    for start in range(0, len(rows), chunk_rows):
+        block_rows = rows[start:start + chunk_rows]
+        scores = (matrix[block_rows] @ transposed).toarray()
+        # a post is not related to itself
+        scores[np.arange(len(block_rows)), block_rows] = -1
+        if n_docs - 1 > k:
+            # argpartition finds the k largest scores of every row without sorting the whole row
+            best = np.argpartition(-scores, k, axis=1)[:, :k]
+        else:
+            best = np.tile(np.arange(n_docs), (len(block_rows), 1))
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best = np.take_along_axis(best, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        for row, neighbours, neighbour_scores in zip(block_rows, best, best_scores):
+            keep = neighbour_scores > 0
+            yield row, neighbours[keep], neighbour_scores[keep]
+
+
+def _batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), ID_BATCH):
+        yield ids[start:start + ID_BATCH]
+
+
+def _set_stale(model, ids, value):
+    for batch in _batches(ids):
+        model.objects.filter(id__in=batch).update(related_stale=value)
+
+
+def _affected_rows(matrix, position, stale_rows, linked_sources, links, k):
+    # Rows (other than the stale ones) whose top-k can change because some posts were edited:
+    # posts that currently list an edited post as a neighbour (linked_sources), and posts for which an edited post
+    # now scores higher than their current k-th neighbour (or that still have fewer than k neighbours).
+    affected = set(position[source_id] for source_id in linked_sources if source_id in position)
+
+    if len(stale_rows):
+        # (all posts x edited posts) similarities; one sparse product, column per edited post
+        scores = matrix @ sparse.csr_matrix(matrix[stale_rows].T)
+        best_new = np.asarray(scores.max(axis=1).todense()).ravel()
+        kth_score = np.zeros(matrix.shape[0], dtype=np.float32)
+        full = np.zeros(matrix.shape[0], dtype=bool)
+        for source_id, lowest, count in links.values_list("source_id").annotate(Min("score"), Count("id")):
+            if source_id in position:
+                kth_score[position[source_id]] = lowest
+                full[position[source_id]] = count >= k
+        beaten = (best_new > kth_score) | (~full & (best_new > 0))
+        affected.update(np.flatnonzero(beaten).tolist())
+    return affected
+
+
+def rebuild_related(model, full=False, k=TOP_K):
+    # Recomputes the related posts of model (Blog or Portfolio) and returns how many posts were recomputed.
+    # full=False only recomputes posts flagged related_stale (set on every save) and the posts they affect,
+    # which is what the periodic background job does. full=True recomputes everything, e.g. after changing k.
+    owners = model.objects.all() if full else model.objects.filter(related_stale=True)
+    # order_by() drops the default ordering, which would otherwise be part of the DISTINCT
+    owners = list(owners.order_by().values_list("owner_id", flat=True).distinct())
+    return sum(rebuild_owner_related(model, owner_id, full, k) for owner_id in owners)
+
+
+def rebuild_owner_related(model, owner_id, full=False, k=TOP_K):
+    # rebuild_related() for the posts of one owner
+    link_model = LINK_MODELS[model]
+    posts = model.objects.filter(owner_id=owner_id)
+    links_of_owner = link_model.objects.filter(source__owner_id=owner_id)
+
+    stale_ids = list(posts.filter(related_stale=True).values_list("id", flat=True))
+    if not full and not stale_ids:
+        return 0
+    linked_sources = []
+    if not full:
+        linked_sources = list(links_of_owner.filter(target__related_stale=True).values_list("source_id", flat=True))
+
+    # The flags are cleared before the texts are read, so a post saved while this is running is flagged again
+    # and picked up by the next run. If anything below fails they are put back.
+    _set_stale(model, stale_ids, False)
+    try:
+        texts = list(posts.filter(is_active=True).values_list("id", "name", "description", "body"))
+        ids = np.array([post[0] for post in texts], dtype=np.int64)
+        position = {post_id: row for row, post_id in enumerate(ids.tolist())}
+        matrix = tfidf_matrix([document_text(*post[1:]) for post in texts])
+
+        if full:
+            rows = np.arange(len(ids))
+        else:
+            stale_rows = np.array(sorted(position[i] for i in stale_ids if i in position), dtype=np.int64)
+            rows = set(stale_rows.tolist()) | _affected_rows(matrix, position, stale_rows, linked_sources,
+                                                             links_of_owner, k)
+            rows = np.array(sorted(rows), dtype=np.int64)
+
+        links = []
+        for row, neighbours, scores in top_k_neighbours(matrix, rows, k):
+            for rank, (neighbour, score) in enumerate(zip(neighbours, scores)):
+                links.append(link_model(source_id=int(ids[row]), target_id=int(ids[neighbour]),
+                                        score=float(score), rank=rank))
+
+        # stale posts may have been deactivated, so their own links go even if they are not recomputed
+        sources = set(ids[rows].tolist()) | set(stale_ids)
+        with transaction.atomic():
+            if full:
+                links_of_owner.delete()
+            else:
+                for batch in _batches(sources):
+                    link_model.objects.filter(source_id__in=batch).delete()
+            links_of_owner.filter(source__is_active=False).delete()
+            link_model.objects.bulk_create(links, batch_size=1000)
+            # the detail pages of the recomputed posts show their related posts, see surrogate.py
+            keys = [model_key(model, source_id) for source_id in sorted(sources)]
+            transaction.on_commit(lambda: purger.purge(keys))
+    except BaseException:
+        _set_stale(model, stale_ids, True)
+        raise
+    return len(rows)
@@ -1,9 +1,13 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete, m2m_changed
 from django.contrib.auth.models import User
 # used as a decorator
 from django.dispatch import receiver
 # User profile that we created
-from . models import UserProfile
+from . models import UserProfile, Blog, Portfolio, Testimonial, Certificate, Skill, ProfileSite
+from .surrogate import object_key, purger
+from .slug_cache import SLUG_CACHES
+from .tenancy import forget_sites, lookups, profile_key
 # we need to wire this signals.py file to apps.py file
 
 
@@ -19,3 +23,106 @@ def create_profile(sender, instance, created, **kwargs):
         userprofile = UserProfile.objects.create(user=instance)
 
 
+# Related posts (see related.py): the links to a deleted post go with it (CASCADE), so the posts that listed it are
+# flagged for the next build_related run, which finds them a new k-th neighbour. pre_delete, as the links are gone
+# by post_delete.
+@receiver(pre_delete, sender=Blog)
+@receiver(pre_delete, sender=Portfolio)
+def flag_related_sources(sender, instance, **kwargs):
+    sender.objects.filter(related_links__target=instance).exclude(pk=instance.pk).update(related_stale=True)
+
+
+# Shared cache purging (see surrogate.py): when content changes, purge the surrogate keys of the pages showing it.
+# transaction.on_commit waits until the change is saved, otherwise the cache could be refilled with the old content.
+def purge(*keys):
+    transaction.on_commit(lambda: purger.purge(keys))
+
+
+# a blog or portfolio is shown on its own page and on the list pages (and the home page, which is tagged with them)
+# of the profile owning it
+@receiver([post_save, post_delete], sender=Blog)
+@receiver([post_save, post_delete], sender=Portfolio)
+def purge_post(sender, instance, **kwargs):
+    purge(object_key(instance), profile_key(instance.owner_id, f"{instance._meta.model_name}-list"))
+
+
+@receiver([post_save, post_delete], sender=Testimonial)
+def purge_testimonials(sender, instance, **kwargs):
+    purge(profile_key(instance.owner_id, "testimonials"))
+
+
+@receiver([post_save, post_delete], sender=Certificate)
+def purge_certificates(sender, instance, **kwargs):
+    purge(profile_key(instance.owner_id, "certificates"))
+
+
+# the profile ("me" in the templates) is the user, their UserProfile and its skills
+def purge_profiles(profile_ids):
+    purge(*(profile_key(profile_id, "profile") for profile_id in profile_ids))
+
+
+@receiver([post_save, post_delete], sender=User)
+def purge_user_profile(sender, instance, update_fields=None, **kwargs):
+    # logging in saves the user with update_fields={"last_login"}, which is not shown on any page
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    purge_profiles(UserProfile.objects.filter(user_id=instance.pk).values_list("id", flat=True))
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def purge_userprofile(sender, instance, **kwargs):
+    purge_profiles([instance.pk])
+
+
+# a skill can be on several profiles
+@receiver([post_save, post_delete], sender=Skill)
+def purge_skill_profiles(sender, instance, **kwargs):
+    purge_profiles(instance.userprofile_set.values_list("id", flat=True))
+
+
+@receiver(m2m_changed, sender=UserProfile.skills.through)
+def purge_profile_skills(sender, instance, reverse, pk_set, **kwargs):
+    # reverse is True when the change was made from the skill's side (skill.userprofile_set.add(...))
+    purge_profiles((pk_set or []) if reverse else [instance.pk])
+
+
+# The host / path prefix -> profile lookups (tenancy.py), and the default profile, are cached in memory.
+# Only the entries a change affects are dropped, so editing one profile leaves the lookups of the others cached:
+# for a ProfileSite its host and prefix before and after the change (the new ones may be cached as missing).
+@receiver(post_init, sender=ProfileSite)
+def remember_site(sender, instance, **kwargs):
+    instance._loaded_site = (instance.host, instance.prefix)
+
+
+@receiver([post_save, post_delete], sender=ProfileSite)
+def forget_site_lookups(sender, instance, **kwargs):
+    old_host, old_prefix = instance._loaded_site
+    forget_sites(("host", old_host), ("prefix", old_prefix), ("host", instance.host), ("prefix", instance.prefix))
+    instance._loaded_site = (instance.host, instance.prefix)
+
+
+# the default profile is the one of the first user, which only changes when a profile is added or removed
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def forget_default_profile(sender, created=True, **kwargs):
+    if created:
+        lookups.discard(("default",))
+
+
+# Slug cache invalidation (see slug_cache.py).
+# The (owner, slug) the object was loaded with is remembered, so when either changes both the old and the new one are
+# dropped (the new one may be cached as "not found").
+@receiver(post_init, sender=Blog)
+@receiver(post_init, sender=Portfolio)
+def remember_slug(sender, instance, **kwargs):
+    instance._loaded_slug = (instance.owner_id, instance.slug)
+
+
+@receiver([post_save, post_delete], sender=Blog)
+@receiver([post_save, post_delete], sender=Portfolio)
+def invalidate_slug(sender, instance, **kwargs):
+    keys = (instance._loaded_slug, (instance.owner_id, instance.slug))
+    # again after commit, a request running meanwhile may have cached the old row
+    SLUG_CACHES[sender].invalidate(*keys)
+    transaction.on_commit(lambda: SLUG_CACHES[sender].invalidate(*keys))
+    instance._loaded_slug = (instance.owner_id, instance.slug)
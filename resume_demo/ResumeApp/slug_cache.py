@@ -0,0 +1,185 @@
+# Read-through cache for the Blog and Portfolio detail pages, which look their object up by slug on every request.
+#
+# Entries are per profile (the owner of the blog/portfolio, see tenancy.py), two profiles can use the same slug.
+# get(owner_id, slug) looks in:
+#   1. a small in-process LRU (SLUG_CACHE["SIZE"] slugs per model, entries live SLUG_CACHE["TTL"] seconds)
+#   2. optionally a shared Django cache (SLUG_CACHE["SHARED"] is an alias of CACHES, e.g. "default")
+#   3. the database
+# A slug that does not exist is cached too ("negative caching") for SLUG_CACHE["NEGATIVE_TTL"] seconds,
+# so bots requesting random or old slugs do not cost a query each time.
+# signals.py invalidates the old and new (owner, slug) whenever a blog/portfolio is saved or deleted, which covers
+# changes of the slug, is_active and the content.
+# Without a shared cache only the process that saved drops its in-process copy, the others after TTL at the latest.
+# With one, every (owner, slug) has a generation number in the shared cache that invalidate() increases; entries are
+# stored with the generation they were read under and are only used while it is still the current one, so all
+# workers see a change at once (at the cost of one shared cache read per lookup).
+# The hit rates are shown to staff at /cache-stats/: "worker" are the counters of the process that answered.
+# With a shared cache every lookup is also counted there, and "all_workers" has the totals of all processes;
+# without one each worker's numbers have to be scraped separately (e.g. from every worker's own port).
+import copy
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Blog, Portfolio
+from .tenancy import profile_key
+
+DEFAULTS = {
+    "SIZE": 1024,
+    "TTL": 60,
+    "NEGATIVE_TTL": 30,
+    "SHARED": None,
+}
+
+# stored in the shared cache for a slug that does not exist, as None means "not in the cache"
+NOT_FOUND = "__not_found__"
+
+
+def slug_cache_setting(name):
+    return getattr(settings, "SLUG_CACHE", {}).get(name, DEFAULTS[name])
+
+
+class SlugCache:
+
+    def __init__(self, model):
+        self.model = model
+        # (owner id, slug) -> (object or None, expiry time), least recently used first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def shared_key(self, key):
+        owner_id, slug = key
+        return profile_key(owner_id, f"slug:{self.model._meta.model_name}:{slug}")
+
+    def generation_key(self, key):
+        return self.shared_key(key) + ":generation"
+
+    def shared_cache(self):
+        alias = slug_cache_setting("SHARED")
+        return caches[alias] if alias else None
+
+    def generation(self, shared, key):
+        # current generation of key in the shared cache. A missing one (never invalidated, or evicted) starts at the
+        # current time rather than 0, so entries stored under a generation that was evicted do not match again.
+        generation_key = self.generation_key(key)
+        generation = shared.get(generation_key)
+        if generation is None:
+            shared.add(generation_key, time.time_ns(), None)
+            generation = shared.get(generation_key)
+        return generation
+
+    def get(self, owner_id, slug):
+        # returns the object of owner_id with this slug or None when there is none
+        key = (owner_id, slug)
+        shared = self.shared_cache()
+        generation = self.generation(shared, key) if shared is not None else None
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            local_hit = entry is not None and entry[1] > now and entry[2] == generation
+            if local_hit:
+                self.entries.move_to_end(key)
+        if local_hit:
+            self.count("local_hits", *(["negative_hits"] if entry[0] is None else []))
+            # a copy, so a view changing its object does not change the cached one
+            return copy.copy(entry[0])
+
+        if shared is not None:
+            value = shared.get(self.shared_key(key))
+            # (generation, object or NOT_FOUND)
+            if value is not None and value[0] == generation:
+                obj = None if value[1] == NOT_FOUND else value[1]
+                self.count("shared_hits", *(["negative_hits"] if obj is None else []))
+                self.store_local(key, obj, generation)
+                return copy.copy(obj)
+
+        self.count("misses")
+        # stored under the generation read before the query: if the row changes meanwhile, the generation moves on
+        # and this entry is not used
+        try:
+            obj = self.model.objects.get(owner_id=owner_id, slug=slug)
+        except self.model.DoesNotExist:
+            obj = None
+        self.store_local(key, obj, generation)
+        if shared is not None:
+            if obj is None:
+                shared.set(self.shared_key(key), (generation, NOT_FOUND), slug_cache_setting("NEGATIVE_TTL"))
+            else:
+                shared.set(self.shared_key(key), (generation, obj), slug_cache_setting("TTL"))
+        return copy.copy(obj)
+
+    def store_local(self, key, obj, generation):
+        ttl = slug_cache_setting("NEGATIVE_TTL") if obj is None else slug_cache_setting("TTL")
+        with self.lock:
+            self.entries[key] = (obj, time.monotonic() + ttl, generation)
+            self.entries.move_to_end(key)
+            while len(self.entries) > slug_cache_setting("SIZE"):
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *keys):
+        # keys are (owner id, slug) pairs
+        keys = [key for key in keys if key[1]]
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        shared = self.shared_cache()
+        if shared is not None:
+            for key in set(keys):
+                # the other workers' copies are stored under the old generation and stop being used
+                try:
+                    shared.incr(self.generation_key(key))
+                except ValueError:
+                    # no generation yet (or evicted): a new one is started, which no entry is stored under
+                    shared.add(self.generation_key(key), time.time_ns(), None)
+            shared.delete_many([self.shared_key(key) for key in keys])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats_key(self, name):
+        return f"slug-stats:{self.model._meta.model_name}:{name}"
+
+    def count(self, *names):
+        # threads of one worker share self.stats, so it is only changed under the lock
+        with self.lock:
+            self.stats.update(names)
+        shared = self.shared_cache()
+        if shared is not None:
+            for name in names:
+                try:
+                    shared.incr(self.stats_key(name))
+                except ValueError:
+                    # first count: add() fails when another worker just added it, which then has to be incremented
+                    if not shared.add(self.stats_key(name), 1, None):
+                        shared.incr(self.stats_key(name))
+
+    @staticmethod
+    def with_hit_rate(stats):
+        lookups = stats.get("local_hits", 0) + stats.get("shared_hits", 0) + stats.get("misses", 0)
+        hits = lookups - stats.get("misses", 0)
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else None
+        return stats
+
+    def get_stats(self):
+        with self.lock:
+            stats = {"worker": self.with_hit_rate(dict(self.stats, size=len(self.entries)))}
+        shared = self.shared_cache()
+        if shared is not None:
+            names = ("local_hits", "shared_hits", "negative_hits", "misses")
+            totals = shared.get_many([self.stats_key(name) for name in names])
+            stats["all_workers"] = self.with_hit_rate({name: totals.get(self.stats_key(name), 0) for name in names})
+        return stats
+
+
+blog_cache = SlugCache(Blog)
+portfolio_cache = SlugCache(Portfolio)
+
+SLUG_CACHES = {
+    Blog: blog_cache,
+    Portfolio: portfolio_cache,
+}
@@ -0,0 +1,104 @@
+# Content-addressed storage for every FileField/ImageField upload (avatar, cv, skills, testimonials, media,
+# portfolio and blog), set as DEFAULT_FILE_STORAGE in settings.py.
+#
+# Instead of keeping the uploaded file name, a file is stored under the sha256 hash of its content:
+#   cas/3f/a2/3fa2...e9.png
+# so the same logo uploaded ten times, from any model, is stored on disk once and every row points at the same file.
+# Because a path can only ever hold one content, its URL never changes meaning and can be cached forever
+# (see the MEDIA_URL comment in settings.py).
+#
+# Files are never deleted when a row is deleted or its file is replaced, as other rows may use the same file:
+# orphaned files are removed by the media_gc management command.
+# Existing uploads are moved into this layout by the media_migrate management command.
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import models
+
+# directory inside MEDIA_ROOT holding the content-addressed files
+CAS_DIRECTORY = "cas"
+# uploads are written here while they are hashed, then moved to their content name
+TEMP_DIRECTORY = posixpath.join(CAS_DIRECTORY, "tmp")
+# hashing and writing is done in chunks of this size, so large uploads are never held in memory
+CHUNK_SIZE = 64 * 1024
+
+
+def content_name(digest, original_name):
+    # cas/<first 2 hex>/<next 2 hex>/<hash><extension>, the two levels keep directories small
+    extension = os.path.splitext(original_name)[1].lower()
+    return posixpath.join(CAS_DIRECTORY, digest[:2], digest[2:4], digest + extension)
+
+
+def is_content_name(name):
+    return bool(name) and name.startswith(CAS_DIRECTORY + "/")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    # the name is decided by the content in _save(), so the name Django proposes is never changed here
+    # (the default would append random characters when the file already exists, which breaks deduplication)
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        temp_directory = self.path(TEMP_DIRECTORY)
+        os.makedirs(temp_directory, exist_ok=True)
+
+        # write to a temporary file in the same file system while hashing, so the upload is read only once
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=temp_directory, delete=False) as temp_file:
+            try:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+            except BaseException:
+                temp_file.close()
+                os.remove(temp_file.name)
+                raise
+
+        name = content_name(digest.hexdigest(), name)
+        full_path = self.path(name)
+        try:
+            # Same content is already stored, nothing to write. The file may be an orphan about to be collected, so
+            # its modification time is reset: media_gc keeps files younger than --min-age, which gives the row that
+            # is about to point at it again the time to be saved.
+            os.utime(full_path)
+            os.remove(temp_file.name)
+            return name
+        except FileNotFoundError:
+            # not stored yet, or media_gc removed it just now
+            pass
+
+        directory = os.path.dirname(full_path)
+        if self.directory_permissions_mode is not None:
+            os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp_file.name, self.file_permissions_mode)
+        # os.replace is atomic, two processes storing the same content at once both end up with the same file
+        os.replace(temp_file.name, full_path)
+        return name
+
+    # a content-addressed file may be shared by several rows, so deleting it is left to the media_gc command
+    def delete(self, name):
+        if not is_content_name(name):
+            super().delete(name)
+
+    # actually removes a file, used by media_gc and media_migrate
+    def purge(self, name):
+        super().delete(name)
+
+
+def file_fields():
+    # (model, field) for every FileField/ImageField of every installed model that stores in a ContentAddressedStorage
+    for model in apps.get_models():
+        for field in model._meta.get_fields():
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                yield model, field
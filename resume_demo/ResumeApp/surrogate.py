@@ -0,0 +1,120 @@
+# Surrogate keys (cache tags) for a shared cache / CDN in front of the site.
+#
+# Every page says which content it shows in a Surrogate-Key (Fastly, Varnish) and Cache-Tag (Cloudflare) header:
+#   home page       profile testimonials certificates blog-list portfolio-list
+#   blog list       blog-list
+#   blog post       blog:<id>
+#   portfolio list  portfolio-list
+#   portfolio       portfolio:<id>
+# Except for blog:<id> and portfolio:<id>, keys are namespaced by the profile the page is for (tenancy.py),
+# e.g. p12:blog-list, so an edit in one profile does not purge the pages of the others.
+# When content changes, signals.py asks for the matching keys to be purged, e.g. a blog edit purges
+# blog:<id> and blog-list, which is that post, the blog list pages and the home page and nothing else.
+# build_related (related.py) purges blog:<id> / portfolio:<id> of every post whose related posts it recomputed.
+# Purges are collected for SURROGATE_PURGE["DEBOUNCE"] seconds and sent as one POST to SURROGATE_PURGE["ENDPOINT"],
+# so saving many objects at once (admin actions, imports) sends a few requests instead of one per object.
+# python manage.py purge_receiver runs a local endpoint that prints the purges, for trying this out offline.
+import atexit
+import json
+import logging
+import threading
+import urllib.request
+
+from django.conf import settings
+
+from .tenancy import profile_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    # None disables purging
+    "ENDPOINT": None,
+    # extra headers for the purge request, e.g. {"Fastly-Key": "..."}
+    "HEADERS": {},
+    "DEBOUNCE": 1.0,
+    "MAX_BATCH": 256,
+    "TIMEOUT": 5,
+}
+
+
+def purge_setting(name):
+    return getattr(settings, "SURROGATE_PURGE", {}).get(name, DEFAULTS[name])
+
+
+def object_key(instance):
+    # blog:12, portfolio:3 ...
+    return model_key(instance, instance.pk)
+
+
+def model_key(model, pk):
+    # object_key() without loading the object, model can be the class or an instance
+    return f"{model._meta.model_name}:{pk}"
+
+
+class SurrogateKeyMixin:
+    # For class based views: surrogate_keys lists the fixed keys of the page,
+    # get_surrogate_keys() can add keys of the objects shown (DetailViews add the key of their object).
+    surrogate_keys = ()
+
+    def get_surrogate_keys(self):
+        profile_id = getattr(self.request, "profile_id", None)
+        keys = [profile_key(profile_id, key) for key in self.surrogate_keys]
+        if getattr(self, "object", None) is not None:
+            keys.append(object_key(self.object))
+        return keys
+
+    def render_to_response(self, context, **response_kwargs):
+        response = super().render_to_response(context, **response_kwargs)
+        keys = self.get_surrogate_keys()
+        if keys:
+            response["Surrogate-Key"] = " ".join(keys)
+            response["Cache-Tag"] = ",".join(keys)
+        return response
+
+
+class Purger:
+    # Collects keys and sends them in batches from a timer thread, DEBOUNCE seconds after the first key came in.
+
+    def __init__(self):
+        self.keys = set()
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def purge(self, keys):
+        if not purge_setting("ENDPOINT"):
+            return
+        with self.lock:
+            self.keys.update(keys)
+            if self.timer is None:
+                self.timer = threading.Timer(purge_setting("DEBOUNCE"), self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            keys = sorted(self.keys)
+            self.keys = set()
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        batch_size = purge_setting("MAX_BATCH")
+        for start in range(0, len(keys), batch_size):
+            self.send(keys[start:start + batch_size])
+
+    def send(self, keys):
+        # same body as Fastly's batch purge API: {"surrogate_keys": [...]}
+        headers = {"Content-Type": "application/json", "Surrogate-Key": " ".join(keys)}
+        headers.update(purge_setting("HEADERS"))
+        request = urllib.request.Request(purge_setting("ENDPOINT"), method="POST", headers=headers,
+                                         data=json.dumps({"surrogate_keys": keys}).encode())
+        try:
+            with urllib.request.urlopen(request, timeout=purge_setting("TIMEOUT")) as response:
+                response.read()
+        except OSError:
+            # the cache keeps serving the old page until it expires, which is not worth failing a request for
+            logger.exception("Purging %s failed", keys)
+
+
+purger = Purger()
+# send what is still waiting when the process exits
+atexit.register(purger.flush)
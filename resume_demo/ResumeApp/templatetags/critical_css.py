@@ -0,0 +1,16 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from ResumeApp.critical_css import inline_css
+
+register = template.Library()
+
+
+# {% critical_css as css %} in base.html: the critical css of the current page (see ResumeApp/critical_css.py),
+# None when it was not built for this page, which then loads its stylesheets the usual render-blocking way.
+@register.simple_tag(takes_context=True)
+def critical_css(context):
+    request = context.get("request")
+    match = getattr(request, "resolver_match", None)
+    css = inline_css(match.url_name if match else None)
+    return mark_safe(css) if css else None
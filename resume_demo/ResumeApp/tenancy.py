@@ -0,0 +1,156 @@
+# Serving many profiles (resumes) from one deployment.
+#
+# ProfileMiddleware finds the profile a request is for and sets request.profile_id:
+#   1. by the host name, e.g. jane.example.com -> ProfileSite(host="jane.example.com")
+#   2. by the first part of the path, e.g. example.com/jane/blog/ -> ProfileSite(prefix="jane"); the prefix is then
+#      removed from request.path_info so the normal urls match, and added to every url made by {% url %} / reverse()
+#   3. otherwise the first profile, which is what a deployment with a single profile always gets
+# The lookups are cached in a small in-process LRU, so a request normally costs no query to find its profile.
+# Hosts and prefixes without a ProfileSite are cached in a separate, smaller LRU, so bots requesting random paths
+# (/xyz123/...) can not push the real ones out; first path parts the site routes itself (admin, blog ...) are never
+# looked up, and ProfileSite rejects them as prefixes (see models.is_reserved_prefix).
+# The views only show blogs, portfolios, testimonials and certificates whose owner is request.profile_id,
+# and the slug cache and surrogate keys are namespaced per profile so one profile's edit leaves the others cached.
+# Messages sent from a profile's contact page are saved with that profile as their owner.
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.urls import get_script_prefix, set_script_prefix
+
+from .models import ProfileSite, UserProfile, is_reserved_prefix
+
+DEFAULTS = {
+    # host names / prefixes kept in memory per worker process
+    "SIZE": 10000,
+    # host names / prefixes without a profile kept in memory per worker process
+    "MISSING_SIZE": 1000,
+    # seconds a lookup is cached; a ProfileSite change drops its lookups in this process at once, in others after TTL
+    "TTL": 300,
+}
+
+# cached value for a host or prefix that has no ProfileSite
+NO_PROFILE = 0
+
+
+def tenancy_setting(name):
+    return getattr(settings, "PROFILE_SITES", {}).get(name, DEFAULTS[name])
+
+
+class LookupCache:
+    # LRU of key -> profile id with expiry, safe to use from several threads
+
+    def __init__(self, size_setting="SIZE"):
+        self.size_setting = size_setting
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def peek(self, key):
+        # the cached value or None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self.entries.move_to_end(key)
+                return entry[0]
+        return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + tenancy_setting("TTL"))
+            self.entries.move_to_end(key)
+            while len(self.entries) > tenancy_setting(self.size_setting):
+                self.entries.popitem(last=False)
+
+    def get(self, key, load):
+        value = self.peek(key)
+        if value is None:
+            value = load()
+            self.put(key, value)
+        return value
+
+    def discard(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+lookups = LookupCache()
+# hosts / prefixes that have no ProfileSite
+missing = LookupCache("MISSING_SIZE")
+
+
+def _site_lookup(key, **filters):
+    if missing.peek(key) is not None:
+        return NO_PROFILE
+    profile_id = lookups.peek(key)
+    if profile_id is None:
+        profile_id = ProfileSite.objects.filter(**filters).values_list("profile_id", flat=True).first()
+        if profile_id:
+            lookups.put(key, profile_id)
+        else:
+            profile_id = NO_PROFILE
+            missing.put(key, NO_PROFILE)
+    return profile_id
+
+
+def profile_for_host(host):
+    return _site_lookup(("host", host), host=host)
+
+
+def profile_for_prefix(prefix):
+    return _site_lookup(("prefix", prefix), prefix=prefix)
+
+
+def forget_sites(*keys):
+    # drops ("host", ...) / ("prefix", ...) lookups of this process, cached as found or as missing
+    lookups.discard(*keys)
+    missing.discard(*keys)
+
+
+def default_profile():
+    # same profile the site showed before there were several: the one of the first user
+    return lookups.get(("default",), lambda: UserProfile.objects.order_by("user_id").values_list(
+        "id", flat=True).first() or NO_PROFILE)
+
+
+def profile_key(profile_id, key):
+    # namespaces a cache key / surrogate key by profile, e.g. p12:blog-list
+    return f"p{profile_id}:{key}" if profile_id else key
+
+
+class ProfileMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # get_host() checks ALLOWED_HOSTS; the port is not part of the name looked up
+        host = request.get_host().rsplit(":", 1)[0].lower()
+        profile_id = profile_for_host(host)
+
+        prefix = None
+        if not profile_id:
+            first, _, rest = request.path_info.lstrip("/").partition("/")
+            # /admin/, /blog/ ... are pages of the site, not profiles
+            if first and not is_reserved_prefix(first):
+                profile_id = profile_for_prefix(first)
+                if profile_id:
+                    prefix = first
+                    request.path_info = "/" + rest
+
+        request.profile_id = profile_id or default_profile() or None
+        if prefix is None:
+            return self.get_response(request)
+
+        # reverse() and {% url %} start every url with the script prefix, so links stay inside /<prefix>/
+        script_prefix = get_script_prefix()
+        set_script_prefix(f"{script_prefix}{prefix}/")
+        try:
+            return self.get_response(request)
+        finally:
+            set_script_prefix(script_prefix)
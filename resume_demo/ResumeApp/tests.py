@@ -1,3 +1,455 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache as shared_cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .management.commands import archive_contacts
+from .models import Blog, ContactProfile, ContactProfileArchive, Portfolio, ProfileSite, RelatedBlog, Testimonial
+from .related import rebuild_related
+from .slug_cache import SLUG_CACHES, SlugCache
+from .storage import TEMP_DIRECTORY
+from .views import BlogDetailView
+from . import related, surrogate, tenancy
+
+
+def clear_caches():
+    # the lookup and slug caches live in the process, not in the test database
+    tenancy.lookups.clear()
+    tenancy.missing.clear()
+    for cache in SLUG_CACHES.values():
+        cache.clear()
+
+
+# Serving many profiles from one deployment (tenancy.py): a profile is found by host or by path prefix,
+# and every page only shows the content of its own profile.
+@override_settings(ALLOWED_HOSTS=["*"])
+class ProfileSiteTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        # the first user's profile is the default one
+        self.default = User.objects.create_user("default").userprofile
+        self.jane = User.objects.create_user("jane").userprofile
+        ProfileSite.objects.create(profile=self.jane, prefix="jane")
+        ProfileSite.objects.create(profile=self.jane, host="jane.example.com")
+        # the same slug in both profiles
+        Blog.objects.create(name="Hello", description="default's post", owner=self.default)
+        Blog.objects.create(name="Hello", description="jane's post", owner=self.jane)
+        Blog.objects.create(name="Only Jane", owner=self.jane)
+
+    def test_prefix_routing(self):
+        response = self.client.get("/jane/blog/hello")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "jane&#x27;s post")
+        # links made by {% url %} stay inside the prefix
+        self.assertContains(response, 'href="/jane/blog/"')
+
+    def test_host_routing(self):
+        response = self.client.get("/blog/hello", HTTP_HOST="Jane.Example.com")
+        self.assertContains(response, "jane&#x27;s post")
+
+    def test_default_profile(self):
+        response = self.client.get("/blog/hello")
+        self.assertContains(response, "default&#x27;s post")
+        self.assertNotContains(response, "jane&#x27;s post")
+
+    def test_other_profiles_posts_are_not_found(self):
+        self.assertEqual(self.client.get("/blog/only-jane").status_code, 404)
+        self.assertEqual(self.client.get("/jane/blog/only-jane").status_code, 200)
+
+    def test_unknown_prefix_is_not_a_profile(self):
+        self.assertEqual(self.client.get("/nobody/blog/hello").status_code, 404)
+
+    def test_reserved_prefixes_are_rejected(self):
+        for prefix in ("admin", "blog", "portfolio", "contact", "cache-stats", "static", "media"):
+            with self.subTest(prefix=prefix), self.assertRaises(ValidationError):
+                ProfileSite(profile=self.jane, prefix=prefix).full_clean()
+        ProfileSite(profile=self.jane, prefix="jim").full_clean()
+
+    def test_site_routes_win_over_a_reserved_prefix(self):
+        # saved without validation, the admin is still the admin
+        ProfileSite.objects.create(profile=self.jane, prefix="admin")
+        response = self.client.get("/admin/")
+        self.assertRedirects(response, "/admin/login/?next=/admin/")
+
+    def test_unknown_prefixes_are_cached_apart(self):
+        self.client.get("/jane/blog/hello")
+        self.client.get("/xyz123/")
+        found = dict(tenancy.lookups.entries)
+        self.assertIn(("prefix", "xyz123"), tenancy.missing.entries)
+        self.assertNotIn(("prefix", "xyz123"), found)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get("/xyz123/")
+        self.assertEqual(len(queries), 0)
+
+    def test_site_change_drops_only_its_lookups(self):
+        jim = User.objects.create_user("jim").userprofile
+        ProfileSite.objects.create(profile=jim, prefix="jim")
+        self.assertEqual(tenancy.profile_for_prefix("jane"), self.jane.id)
+        self.assertEqual(tenancy.profile_for_prefix("jim"), jim.id)
+        # another profile's edit keeps jane's lookup cached
+        jim.bio = "new bio"
+        jim.save()
+        self.assertIn(("prefix", "jane"), tenancy.lookups.entries)
+        site = ProfileSite.objects.get(prefix="jim")
+        site.prefix = "james"
+        site.save()
+        self.assertIn(("prefix", "jane"), tenancy.lookups.entries)
+        self.assertEqual(tenancy.profile_for_prefix("jim"), tenancy.NO_PROFILE)
+        self.assertEqual(tenancy.profile_for_prefix("james"), jim.id)
+
+    def test_contact_message_goes_to_the_profile(self):
+        message = {"name": "Joe", "email": "joe@example.com", "message": "hi"}
+        self.assertRedirects(self.client.post("/jane/contact/", message), "/jane/", fetch_redirect_response=False)
+        self.client.post("/contact/", message)
+        self.assertEqual(list(ContactProfile.objects.order_by("id").values_list("owner", flat=True)),
+                         [self.jane.id, self.default.id])
+
+
+# The slug cache (slug_cache.py) is namespaced by profile, and with a shared cache a change is seen by every worker.
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+                   SLUG_CACHE={"SHARED": "default"})
+class SlugCacheTests(TestCase):
+
+    def setUp(self):
+        # the module level caches live in the process, not in the test database, and so does the locmem "shared" one
+        for cache in SLUG_CACHES.values():
+            cache.clear()
+        shared_cache.clear()
+        self.default = User.objects.create_user("default").userprofile
+        self.jane = User.objects.create_user("jane").userprofile
+
+    def test_namespaced_by_owner(self):
+        Blog.objects.create(name="Hello", description="default's", owner=self.default)
+        Blog.objects.create(name="Hello", description="jane's", owner=self.jane)
+        cache = SlugCache(Blog)
+        self.assertEqual(cache.get(self.default.id, "hello").description, "default's")
+        self.assertEqual(cache.get(self.jane.id, "hello").description, "jane's")
+
+    def test_change_reaches_other_workers(self):
+        # two caches standing in for two worker processes sharing one cache
+        worker, other_worker = SlugCache(Blog), SlugCache(Blog)
+        self.assertIsNone(other_worker.get(self.jane.id, "new-post"))
+        blog = Blog.objects.create(name="New post", owner=self.jane)
+        worker.invalidate((self.jane.id, "new-post"))
+        self.assertEqual(other_worker.get(self.jane.id, "new-post").name, "New post")
+        blog.name = "Changed"
+        blog.save()
+        worker.invalidate((self.jane.id, "new-post"))
+        self.assertEqual(other_worker.get(self.jane.id, "new-post").name, "Changed")
+
+    def test_stats_add_up_across_threads_and_workers(self):
+        Blog.objects.create(name="Hello", owner=self.jane)
+        worker, other_worker = SlugCache(Blog), SlugCache(Blog)
+        worker.get(self.jane.id, "hello")
+        threads = [threading.Thread(target=lambda: [other_worker.count("local_hits") for _ in range(200)])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(other_worker.get_stats()["worker"]["local_hits"], 1600)
+        totals = worker.get_stats()["all_workers"]
+        self.assertEqual((totals["misses"], totals["local_hits"]), (1, 1600))
+        self.assertEqual(worker.get_stats()["worker"]["misses"], 1)
+
+
+# archive_contacts --archive file continues an interrupted run without writing a row twice.
+class ArchiveContactsTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.jane = User.objects.create_user("jane").userprofile
+        for number in range(10):
+            ContactProfile.objects.create(name=f"contact {number}", email="a@example.com", message="hi",
+                                          owner=self.jane)
+        ContactProfile.objects.update(timestamp=timezone.now() - timedelta(days=1000))
+
+    def archive(self):
+        call_command("archive_contacts", archive="file", directory=self.directory, chunk_size=3, pause=0, days=365,
+                     stdout=open(os.devnull, "w"))
+
+    def test_resume_after_interruption(self):
+        append = archive_contacts.Command.append
+
+        def interrupted_append(path, rows):
+            # the second chunk is written, plus the start of a gzip member, and the state is never saved
+            offset = append(path, rows)
+            if interrupted_append.calls == 1:
+                with open(path, "ab") as archive_file:
+                    archive_file.write(b"\x1f\x8b\x08")
+                raise KeyboardInterrupt
+            interrupted_append.calls += 1
+            return offset
+        interrupted_append.calls = 0
+
+        with mock.patch.object(archive_contacts.Command, "append", staticmethod(interrupted_append)):
+            with self.assertRaises(KeyboardInterrupt):
+                self.archive()
+        self.assertEqual(ContactProfile.objects.count(), 7)
+
+        self.archive()
+        files = [name for name in os.listdir(self.directory) if name.endswith(".ndjson.gz")]
+        self.assertEqual(len(files), 1)
+        with gzip.open(os.path.join(self.directory, files[0]), "rt") as archive_file:
+            rows = [json.loads(line) for line in archive_file]
+        self.assertEqual([row["name"] for row in rows], [f"contact {number}" for number in range(10)])
+        self.assertEqual({row["owner_id"] for row in rows}, {self.jane.id})
+        self.assertEqual(ContactProfile.objects.count(), 0)
+
+    def test_archive_table_keeps_the_owner(self):
+        call_command("archive_contacts", archive="table", chunk_size=3, pause=0, days=365, stdout=open(os.devnull, "w"))
+        self.assertEqual(ContactProfileArchive.objects.filter(owner=self.jane).count(), 10)
+        self.assertEqual(ContactProfile.objects.count(), 0)
+
+
+# Related posts (related.py): an incremental rebuild after a change leaves the same neighbours as a full one.
+class RelatedPostsTests(TestCase):
+    K = 2
+
+    def setUp(self):
+        self.jane = User.objects.create_user("jane").userprofile
+        self.jim = User.objects.create_user("jim").userprofile
+        texts = [
+            "python django web framework", "python flask web framework", "django orm database queries",
+            "cooking pasta recipe tomato", "cooking pizza recipe cheese", "gardening tomato soil water",
+            "gardening roses soil", "zebra quantum",
+        ]
+        self.posts = [Blog.objects.create(name=text, owner=self.jane) for text in texts]
+        # the same texts in another profile, they must never be linked to jane's
+        for text in texts:
+            Blog.objects.create(name=text, owner=self.jim)
+        rebuild_related(Blog, full=True, k=self.K)
+
+    def links(self):
+        return sorted(RelatedBlog.objects.values_list("source_id", "rank", "target_id"))
+
+    def assert_incremental_matches_full(self):
+        self.assertTrue(Blog.objects.filter(related_stale=True).exists())
+        rebuild_related(Blog, k=self.K)
+        incremental = self.links()
+        self.assertFalse(Blog.objects.filter(related_stale=True).exists())
+        rebuild_related(Blog, full=True, k=self.K)
+        self.assertEqual(incremental, self.links())
+
+    def test_edit(self):
+        post = self.posts[6]
+        post.body = "python django web templates"
+        post.save()
+        self.assert_incremental_matches_full()
+
+    def test_deactivate(self):
+        post = self.posts[1]
+        post.is_active = False
+        post.save()
+        self.assert_incremental_matches_full()
+        self.assertFalse(RelatedBlog.objects.filter(source=post).exists())
+        self.assertFalse(RelatedBlog.objects.filter(target=post).exists())
+
+    def test_delete(self):
+        self.posts[0].delete()
+        self.assert_incremental_matches_full()
+
+    def test_no_shared_terms_no_links(self):
+        zebra = self.posts[7]
+        self.assertFalse(RelatedBlog.objects.filter(source=zebra).exists())
+        self.assertFalse(RelatedBlog.objects.filter(target=zebra).exists())
+
+    def test_links_stay_within_owner(self):
+        self.assertTrue(RelatedBlog.objects.exists())
+        self.assertFalse(RelatedBlog.objects.exclude(source__owner_id=models.F("target__owner_id")).exists())
+
+    def test_stale_flags_restored_on_failure(self):
+        post = self.posts[2]
+        post.save()
+        with mock.patch.object(related, "top_k_neighbours", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                rebuild_related(Blog, k=self.K)
+        self.assertTrue(Blog.objects.get(pk=post.pk).related_stale)
+
+    def test_detail_view_related_in_one_query(self):
+        post = self.posts[0]
+        view = BlogDetailView()
+        view.setup(RequestFactory().get(f"/blog/{post.slug}"), slug=post.slug)
+        view.object = post
+        context = view.get_context_data(object=post)
+        with self.assertNumQueries(1):
+            names = [blog.name for blog in context["related"]]
+        self.assertEqual(len(names), self.K)
+
+
+# Content-addressed media (storage.py) and its media_gc / media_migrate commands.
+class MediaStorageTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        media_root = override_settings(MEDIA_ROOT=self.media_root)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.jane = User.objects.create_user("jane").userprofile
+
+    def run_command(self, *args, **options):
+        call_command(*args, stdout=open(os.devnull, "w"), stderr=open(os.devnull, "w"), **options)
+
+    def age(self, name, hours):
+        # makes a stored file look hours old
+        then = time.time() - hours * 3600
+        os.utime(default_storage.path(name), (then, then))
+
+    def test_same_content_is_stored_once_across_models(self):
+        blog = Blog.objects.create(name="Post", owner=self.jane, image=ContentFile(b"logo", name="logo.png"))
+        testimonial = Testimonial.objects.create(name="Jim", owner=self.jane,
+                                                 thumbnail=ContentFile(b"logo", name="other-name.PNG"))
+        self.assertEqual(blog.image.name, testimonial.thumbnail.name)
+        self.assertTrue(blog.image.name.startswith("cas/"))
+        self.assertTrue(default_storage.exists(blog.image.name))
+
+    def test_gc_keeps_referenced_and_young_files(self):
+        blog = Blog.objects.create(name="Post", owner=self.jane, image=ContentFile(b"used", name="a.png"))
+        young = default_storage.save("x.png", ContentFile(b"orphan, just uploaded"))
+        old = default_storage.save("y.png", ContentFile(b"orphan"))
+        self.age(blog.image.name, 48)
+        self.age(old, 48)
+        self.run_command("media_gc", min_age=24)
+        self.assertTrue(default_storage.exists(blog.image.name))
+        self.assertTrue(default_storage.exists(young))
+        self.assertFalse(default_storage.exists(old))
+
+    def test_gc_counts_every_reference(self):
+        blog = Blog.objects.create(name="Post", owner=self.jane, image=ContentFile(b"shared", name="a.png"))
+        Testimonial.objects.create(name="Jim", owner=self.jane, thumbnail=ContentFile(b"shared", name="b.png"))
+        self.age(blog.image.name, 48)
+        blog.delete()
+        # the testimonial still uses the file
+        self.run_command("media_gc")
+        self.assertTrue(default_storage.exists(blog.image.name))
+        Testimonial.objects.all().delete()
+        self.run_command("media_gc")
+        self.assertFalse(default_storage.exists(blog.image.name))
+
+    def test_reupload_restarts_the_grace_period(self):
+        name = default_storage.save("a.png", ContentFile(b"orphan"))
+        self.age(name, 48)
+        self.assertEqual(default_storage.save("b.png", ContentFile(b"orphan")), name)
+        self.run_command("media_gc")
+        self.assertTrue(default_storage.exists(name))
+
+    def test_gc_removes_old_unfinished_uploads(self):
+        os.makedirs(default_storage.path(TEMP_DIRECTORY))
+        for file_name, hours in (("old", 2), ("new", 0)):
+            with open(default_storage.path(f"{TEMP_DIRECTORY}/{file_name}"), "wb") as temp_file:
+                temp_file.write(b"half an upload")
+            self.age(f"{TEMP_DIRECTORY}/{file_name}", hours)
+        self.run_command("media_gc", tmp_age=1)
+        self.assertFalse(default_storage.exists(f"{TEMP_DIRECTORY}/old"))
+        self.assertTrue(default_storage.exists(f"{TEMP_DIRECTORY}/new"))
+
+    def test_migrate(self):
+        # files stored the way they were before ContentAddressedStorage
+        old_storage = FileSystemStorage(location=self.media_root)
+        old_storage.save("blog/logo.png", ContentFile(b"logo"))
+        old_storage.save("testimonials/logo-copy.png", ContentFile(b"logo"))
+        blog = Blog.objects.create(name="Post", owner=self.jane)
+        Blog.objects.filter(pk=blog.pk).update(image="blog/logo.png")
+        testimonial = Testimonial.objects.create(name="Jim", owner=self.jane)
+        Testimonial.objects.filter(pk=testimonial.pk).update(thumbnail="testimonials/logo-copy.png")
+
+        with mock.patch.object(surrogate.purger, "purge") as purge, self.captureOnCommitCallbacks(execute=True):
+            self.run_command("media_migrate")
+        blog.refresh_from_db()
+        testimonial.refresh_from_db()
+        self.assertTrue(blog.image.name.startswith("cas/"))
+        self.assertEqual(blog.image.name, testimonial.thumbnail.name)
+        self.assertFalse(old_storage.exists("blog/logo.png"))
+        self.assertFalse(old_storage.exists("testimonials/logo-copy.png"))
+        # the cached pages showing the old urls are purged
+        purged = {key for call in purge.call_args_list for key in call.args[0]}
+        self.assertIn(f"blog:{blog.pk}", purged)
+        self.assertIn(f"p{self.jane.pk}:testimonials", purged)
+
+
+# Surrogate keys and purging (surrogate.py, signals.py).
+@override_settings(ALLOWED_HOSTS=["*"])
+class SurrogateKeyTests(TestCase):
+
+    def setUp(self):
+        clear_caches()
+        user = User.objects.create_user("jane")
+        self.jane = user.userprofile
+        # the home page needs these to render
+        type(self.jane).objects.filter(pk=self.jane.pk).update(avatar="avatar.png", cv="cv.pdf")
+        self.blog = Blog.objects.create(name="Hello", owner=self.jane)
+
+    def test_blog_save_purges_its_keys_after_commit(self):
+        with mock.patch.object(surrogate.purger, "purge") as purge:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.blog.name = "Changed"
+                self.blog.save()
+            purge.assert_not_called()
+            for callback in callbacks:
+                callback()
+        purged = {key for call in purge.call_args_list for key in call.args[0]}
+        self.assertEqual(purged, {f"blog:{self.blog.pk}", f"p{self.jane.pk}:blog-list"})
+
+    def test_login_sends_no_purge(self):
+        user = self.jane.user
+        with mock.patch.object(surrogate.purger, "purge") as purge, self.captureOnCommitCallbacks(execute=True):
+            user.last_login = timezone.now()
+            user.save(update_fields=["last_login"])
+        purge.assert_not_called()
+        with mock.patch.object(surrogate.purger, "purge") as purge, self.captureOnCommitCallbacks(execute=True):
+            user.first_name = "Jane"
+            user.save()
+        purge.assert_called_once_with((f"p{self.jane.pk}:profile",))
+
+    def test_purges_are_batched(self):
+        for max_batch, posts in ((256, 1), (2, 3)):
+            with self.subTest(max_batch=max_batch), override_settings(SURROGATE_PURGE={
+                    "ENDPOINT": "http://purge.invalid/", "DEBOUNCE": 0.05, "MAX_BATCH": max_batch}):
+                purger = surrogate.Purger()
+                with mock.patch.object(surrogate.urllib.request, "urlopen") as urlopen:
+                    for number in range(5):
+                        purger.purge([f"blog:{number}", "p1:blog-list"])
+                    # the timer thread sends everything DEBOUNCE seconds after the first purge
+                    deadline = time.monotonic() + 5
+                    while purger.timer is not None and time.monotonic() < deadline:
+                        time.sleep(0.01)
+                self.assertEqual(urlopen.call_count, posts)
+                sent = [json.loads(call.args[0].data)["surrogate_keys"] for call in urlopen.call_args_list]
+                self.assertTrue(all(len(keys) <= max_batch for keys in sent))
+                self.assertEqual(sorted(key for keys in sent for key in keys),
+                                 sorted(["p1:blog-list"] + [f"blog:{number}" for number in range(5)]))
+
+    def test_response_headers(self):
+        profile = f"p{self.jane.pk}"
+        pages = {
+            "/": [f"{profile}:{key}" for key in
+                  ("profile", "testimonials", "certificates", "blog-list", "portfolio-list")],
+            "/blog/": [f"{profile}:blog-list"],
+            "/portfolio/": [f"{profile}:portfolio-list"],
+            "/blog/hello": [f"blog:{self.blog.pk}"],
+        }
+        for url, keys in pages.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response["Surrogate-Key"], " ".join(keys))
+                self.assertEqual(response["Cache-Tag"], ",".join(keys))
 
-# Create your tests here.
@@ -12,5 +12,7 @@ urlpatterns = [
     path('portfolio/<slug:slug>', views.PortfolioDetailView.as_view(), name="portfolio"),
     path('blog/', views.BlogView.as_view(), name="blogs"),
     path('blog/<slug:slug>', views.BlogDetailView.as_view(), name="blog"),
+    # slug cache hit rates for monitoring
+    path('cache-stats/', views.cache_stats, name="cache-stats"),
 
 ]
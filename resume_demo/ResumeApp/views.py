@@ -1,10 +1,17 @@
 from django.shortcuts import render
+from django.urls import reverse_lazy
+from django.http import Http404, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
 # when the form is valid and is saved then message appears saying as Thank You
 from django.contrib import messages
 from .models import (UserProfile, Blog, Portfolio, Testimonial, Certificate)
 # importing generic to use generic views i.e. form views, list views etc. (builtin views)
 from django.views import generic
 from .forms import ContactForm
+# Surrogate-Key / Cache-Tag headers for the shared cache, see surrogate.py
+from .surrogate import SurrogateKeyMixin
+# detail pages look their object up through the slug cache, see slug_cache.py
+from .slug_cache import blog_cache, portfolio_cache
 
 
 # TemplateView: class based generic views to accomplish common tasks.
@@ -16,18 +23,22 @@ from .forms import ContactForm
 # Showing ‘about us’ like pages that are static and hardly need any context.
 # Though, it is easy to use context variables with TemplateView.
 # Showing pages that work with GET requests and don’t have forms in them.
-class IndexView(generic.TemplateView):
+class IndexView(SurrogateKeyMixin, generic.TemplateView):
     template_name = "ResumeApp/index.html"
+    # the home page shows the profile ("me"), testimonials, certificates, blogs and portfolios
+    surrogate_keys = ("profile", "testimonials", "certificates", "blog-list", "portfolio-list")
 
     # This method is used to populate a dictionary to use as the template context
     def get_context_data(self, **kwargs):
         # Returns context data for displaying the object
         context = super().get_context_data(**kwargs)
 
-        testimonials = Testimonial.objects.filter(is_active=True)
-        certificates = Certificate.objects.filter(is_active=True)
-        blogs = Blog.objects.filter(is_active=True)
-        portfolio = Portfolio.objects.filter(is_active=True)
+        # only the content of the profile this request is for (request.profile_id is set by tenancy.ProfileMiddleware)
+        owner_id = self.request.profile_id
+        testimonials = Testimonial.objects.filter(owner_id=owner_id, is_active=True)
+        certificates = Certificate.objects.filter(owner_id=owner_id, is_active=True)
+        blogs = Blog.objects.filter(owner_id=owner_id, is_active=True)
+        portfolio = Portfolio.objects.filter(owner_id=owner_id, is_active=True)
 
         context["testimonials"] = testimonials
         context["certificates"] = certificates
@@ -40,10 +51,16 @@ class ContactView(generic.FormView):
     template_name = "ResumeApp/contact.html"
     form_class = ContactForm
     # user will get redirected when the form is valid
-    success_url = "/"
+    # reverse_lazy instead of "/" so a profile served under a path prefix goes back to its own home page
+    success_url = reverse_lazy("ResumeApp:home")
 
     # form valid method
     def form_valid(self, form):
+        # the message goes to the profile whose contact page it was sent from
+        if self.request.profile_id is None:
+            # no profile yet (no user created), nobody to send it to
+            raise Http404("No profile to contact")
+        form.instance.owner_id = self.request.profile_id
         # save the form instance
         form.save()
         # send the message success
@@ -51,9 +68,10 @@ class ContactView(generic.FormView):
         return super().form_valid(form)
 
 
-class PortfolioView(generic.ListView):
+class PortfolioView(SurrogateKeyMixin, generic.ListView):
     model = Portfolio
     template_name = "ResumeApp/portfolio.html"
+    surrogate_keys = ("portfolio-list",)
     # django.views.generic.list.ListView provides a builtin way to paginate the displayed list.
     # You can do this by adding a paginate_by attribute to your view class.
     # will show first 2 objects
@@ -64,25 +82,64 @@ class PortfolioView(generic.ListView):
     # That means that get_queryset is useful if you want to adjust the query dynamically.
     # For example, you could return objects that belong to the current user
     def get_queryset(self):
-        # only active portfolios are returned
-        return super().get_queryset().filter(is_active=True)
+        # only active portfolios of this request's profile are returned
+        return super().get_queryset().filter(owner_id=self.request.profile_id, is_active=True)
 
 
-class PortfolioDetailView(generic.DetailView):
+# the page of one portfolio gets the key portfolio:<id> from SurrogateKeyMixin
+class PortfolioDetailView(SurrogateKeyMixin, generic.DetailView):
     model = Portfolio
     template_name = "ResumeApp/portfolio-detail.html"
 
+    # instead of Portfolio.objects.get(slug=...) on every request, including for slugs that do not exist
+    def get_object(self, queryset=None):
+        portfolio = portfolio_cache.get(self.request.profile_id, self.kwargs["slug"])
+        if portfolio is None:
+            raise Http404("No portfolio found matching the query")
+        return portfolio
 
-class BlogView(generic.ListView):
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # related posts are precomputed by the build_related command (see related.py),
+        # so this is a single query using the (source, rank) index of the RelatedPortfolio table
+        context["related"] = Portfolio.objects.filter(
+            related_to__source=self.object, owner_id=self.object.owner_id, is_active=True).order_by("related_to__rank")
+        return context
+
+
+class BlogView(SurrogateKeyMixin, generic.ListView):
     model = Blog
     template_name = "ResumeApp/blog.html"
+    surrogate_keys = ("blog-list",)
     paginate_by = 10
 
     # Used by ListViews - it determines the list of objects that you want to display
     def get_queryset(self):
-        return super().get_queryset().filter(is_active=True)
+        return super().get_queryset().filter(owner_id=self.request.profile_id, is_active=True)
 
 
-class BlogDetailView(generic.DetailView):
+class BlogDetailView(SurrogateKeyMixin, generic.DetailView):
     model = Blog
-    template_name = "ResumeApp/blog-detail.html"
\ No newline at end of file
+    template_name = "ResumeApp/blog-detail.html"
+
+    def get_object(self, queryset=None):
+        blog = blog_cache.get(self.request.profile_id, self.kwargs["slug"])
+        if blog is None:
+            raise Http404("No blog found matching the query")
+        return blog
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["related"] = Blog.objects.filter(
+            related_to__source=self.object, owner_id=self.object.owner_id, is_active=True).order_by("related_to__rank")
+        return context
+
+
+# hit rates of the slug caches, for monitoring (staff only): of the worker process that answered, and of all workers
+# together when SLUG_CACHE["SHARED"] is set (see slug_cache.py)
+@staff_member_required
+def cache_stats(request):
+    return JsonResponse({
+        "blog": blog_cache.get_stats(),
+        "portfolio": portfolio_cache.get_stats(),
+    })
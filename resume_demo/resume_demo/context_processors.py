@@ -1,10 +1,18 @@
 # added User model
 from django.contrib.auth.models import User
+from django.utils.functional import SimpleLazyObject
 
 
 def project_context(request):
+    # "me" is the user of the profile the request is for (request.profile_id, set by ResumeApp.tenancy)
     # first(), which takes a query set and returns the first element, or None if the query set was empty.
+    # SimpleLazyObject only runs the query when a template actually uses "me".
+    profile_id = getattr(request, "profile_id", None)
+    if profile_id:
+        me = SimpleLazyObject(lambda: User.objects.filter(userprofile__id=profile_id).first())
+    else:
+        me = SimpleLazyObject(lambda: User.objects.first())
     context = {
-        'me': User.objects.first(),
+        'me': me,
     }
-    return context
\ No newline at end of file
+    return context
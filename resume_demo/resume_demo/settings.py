@@ -45,12 +45,17 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # finds the profile (resume) a request is for from its host or path prefix (see ResumeApp/tenancy.py),
+    # before CommonMiddleware as it removes the path prefix
+    'ResumeApp.tenancy.ProfileMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # opt-in sampling profiler, configured by PROFILER below (see ResumeApp/profiling.py)
+    'ResumeApp.profiling.SamplingProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'resume_demo.urls'
@@ -135,7 +140,80 @@ STATIC_ROOT = BASE_DIR/"staticfiles"
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR/"mediafiles"
 
+# Uploads are stored once per content under mediafiles/cas/ (see ResumeApp/storage.py),
+# identical files uploaded to different models share one file on disk.
+# A file under /media/cas/ never changes, so the web server in front of Django can serve it with
+# "Cache-Control: public, max-age=31536000, immutable", e.g. for nginx:
+#   location /media/cas/ { alias <MEDIA_ROOT>/cas/; add_header Cache-Control "public, max-age=31536000, immutable"; }
+# Unused files are removed with: python manage.py media_gc
+# Files uploaded before this was enabled are moved with: python manage.py media_migrate
+DEFAULT_FILE_STORAGE = 'ResumeApp.storage.ContentAddressedStorage'
+
+# Sampling profiler for live requests (ResumeApp/profiling.py), everything off by default.
+# Profiled requests are written to DIRECTORY as collapsed stacks, merged with: python manage.py profile_stacks
+PROFILER = {
+    # fraction of all requests to profile, e.g. 0.01 for 1%
+    'SAMPLE_RATE': 0.0,
+    # url names always profiled, e.g. ['ResumeApp:blog']
+    'URL_NAMES': [],
+    # staff can profile a single request by sending this header with a token from make_profile_token()
+    'HEADER': 'X-Profile-Token',
+    # seconds between two samples of a profiled request
+    'INTERVAL': 0.005,
+    'DIRECTORY': BASE_DIR/"profiles",
+    # each worker's file is rotated at MAX_BYTES, keeping BACKUP_COUNT old files
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Purging of the shared cache / CDN by surrogate key (ResumeApp/surrogate.py), off while ENDPOINT is None.
+# For trying it out locally: python manage.py purge_receiver, and ENDPOINT 'http://127.0.0.1:8081/purge'
+SURROGATE_PURGE = {
+    'ENDPOINT': None,
+    # extra headers sent with every purge, e.g. the API token of the CDN
+    'HEADERS': {},
+    # seconds to collect keys before sending them in one request
+    'DEBOUNCE': 1.0,
+    # maximum keys per request
+    'MAX_BATCH': 256,
+    'TIMEOUT': 5,
+}
+
+# Read-through cache of the blog/portfolio detail page lookups by slug (ResumeApp/slug_cache.py)
+SLUG_CACHE = {
+    # slugs kept in memory per model and worker process
+    'SIZE': 1024,
+    # seconds an object is cached
+    'TTL': 60,
+    # seconds a slug that does not exist is cached
+    'NEGATIVE_TTL': 30,
+    # alias in CACHES of a cache shared by all workers (e.g. 'default' with memcached/redis), None for memory only;
+    # with several workers set it, so a change is seen by all of them at once instead of after TTL
+    'SHARED': None,
+}
+
+# Retention of contact form messages, enforced by: python manage.py archive_contacts (e.g. daily from cron)
+CONTACT_RETENTION = {
+    # messages older than this many days are archived and removed from ContactProfile
+    'DAYS': 365,
+    # 'table': moved to ContactProfileArchive, 'file': appended to a gzip compressed NDJSON file in DIRECTORY
+    'ARCHIVE': 'table',
+    'DIRECTORY': BASE_DIR/"archive",
+    # rows per transaction, small so the SQLite write lock is only held for a short time
+    'CHUNK_SIZE': 500,
+    # seconds to wait between chunks, so other writers (the contact form) get the lock
+    'PAUSE': 0.05,
+}
+
+# In-process cache of the host / path prefix -> profile lookups (ResumeApp/tenancy.py)
+PROFILE_SITES = {
+    'SIZE': 10000,
+    # hosts / prefixes without a profile (bots trying random paths) are cached apart, in a smaller LRU
+    'MISSING_SIZE': 1000,
+    'TTL': 300,
+}